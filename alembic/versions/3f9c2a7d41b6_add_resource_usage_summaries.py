@@ -0,0 +1,36 @@
+"""add resource_usage_summaries table
+
+Revision ID: 3f9c2a7d41b6
+Revises: 18bc5a720536
+Create Date: 2026-10-19 10:12:31.402118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9c2a7d41b6'
+down_revision: Union[str, None] = '18bc5a720536'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    # Rows are built lazily from resource_usage the first time an experiment is summarized
+    op.create_table(
+        'resource_usage_summaries',
+        sa.Column('experiment_id', sa.Integer(), sa.ForeignKey('experiments.id'), primary_key=True),
+        sa.Column('sample_count', sa.Integer()),
+        sa.Column('total_training_time_sec', sa.Float()),
+        sa.Column('peak_memory_mb', sa.Float()),
+        sa.Column('peak_gpu_memory_mb', sa.Float()),
+        sa.Column('stats', sa.JSON()),
+        sa.Column('updated_at', sa.DateTime(), server_default=sa.func.now())
+    )
+
+
+def downgrade():
+    op.drop_table('resource_usage_summaries')
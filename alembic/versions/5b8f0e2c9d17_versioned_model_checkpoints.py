@@ -0,0 +1,46 @@
+"""versioned model checkpoints
+
+Revision ID: 5b8f0e2c9d17
+Revises: c71d5e08b3a2
+Create Date: 2026-10-19 13:41:22.906731
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b8f0e2c9d17'
+down_revision: Union[str, None] = 'c71d5e08b3a2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    op.add_column('model_files', sa.Column('version', sa.Integer()))
+    op.add_column('model_files', sa.Column('epoch', sa.Integer(), nullable=True))
+    op.add_column('model_files', sa.Column('is_best', sa.Boolean(), server_default=sa.false()))
+    op.add_column('model_files', sa.Column('size_bytes', sa.BigInteger()))
+    op.add_column('model_files', sa.Column('details', sa.JSON()))
+
+    # Existing uploads become versions 1, 2, ... in upload order
+    op.execute("""
+        UPDATE model_files SET version = numbered.version
+        FROM (
+            SELECT id, row_number() OVER (PARTITION BY experiment_id ORDER BY uploaded_at, id) AS version
+            FROM model_files
+        ) AS numbered
+        WHERE model_files.id = numbered.id
+    """)
+    op.create_unique_constraint('uq_model_files_experiment_version', 'model_files', ['experiment_id', 'version'])
+
+
+def downgrade():
+    op.drop_constraint('uq_model_files_experiment_version', 'model_files', type_='unique')
+    op.drop_column('model_files', 'details')
+    op.drop_column('model_files', 'size_bytes')
+    op.drop_column('model_files', 'is_best')
+    op.drop_column('model_files', 'epoch')
+    op.drop_column('model_files', 'version')
@@ -0,0 +1,48 @@
+"""add experiment params and tags
+
+Revision ID: 7d3c1f9a2e45
+Revises: e2a9d4f7c610
+Create Date: 2026-10-19 15:40:37.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7d3c1f9a2e45'
+down_revision: Union[str, None] = 'e2a9d4f7c610'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    op.create_table(
+        'experiment_params',
+        sa.Column('experiment_id', sa.Integer(), sa.ForeignKey('experiments.id'), primary_key=True),
+        sa.Column('key', sa.String(), primary_key=True),
+        sa.Column('value_text', sa.String()),
+        sa.Column('value_num', sa.Float(), nullable=True),
+    )
+    op.create_index('ix_experiment_params_key_num', 'experiment_params', ['key', 'value_num'])
+    op.create_index('ix_experiment_params_key_text', 'experiment_params', ['key', 'value_text'])
+
+    op.create_table(
+        'experiment_tags',
+        sa.Column('experiment_id', sa.Integer(), sa.ForeignKey('experiments.id'), primary_key=True),
+        sa.Column('tag', sa.String(), primary_key=True),
+    )
+    op.create_index('ix_experiment_tags_tag', 'experiment_tags', ['tag'])
+
+    op.create_index('ix_experiments_user_project_id', 'experiments', ['user_id', 'project_id', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_experiments_user_project_id', table_name='experiments')
+    op.drop_index('ix_experiment_tags_tag', table_name='experiment_tags')
+    op.drop_table('experiment_tags')
+    op.drop_index('ix_experiment_params_key_text', table_name='experiment_params')
+    op.drop_index('ix_experiment_params_key_num', table_name='experiment_params')
+    op.drop_table('experiment_params')
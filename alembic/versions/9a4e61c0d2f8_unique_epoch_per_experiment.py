@@ -0,0 +1,52 @@
+"""unique (experiment_id, epoch) for metrics and resource_usage, idempotency keys
+
+Revision ID: 9a4e61c0d2f8
+Revises: 3f9c2a7d41b6
+Create Date: 2026-10-19 11:03:54.118270
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9a4e61c0d2f8'
+down_revision: Union[str, None] = '3f9c2a7d41b6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    # Drop retried duplicates, keeping the most recently inserted row for each epoch
+    op.execute("""
+        DELETE FROM metrics a USING metrics b
+        WHERE a.experiment_id = b.experiment_id AND a.epoch = b.epoch AND a.id < b.id
+    """)
+    op.execute("""
+        DELETE FROM resource_usage a USING resource_usage b
+        WHERE a.experiment_id = b.experiment_id AND a.epoch = b.epoch AND a.id < b.id
+    """)
+    # Summaries may include the duplicates; they are rebuilt lazily on next read/ingest
+    op.execute("DELETE FROM resource_usage_summaries")
+
+    op.create_unique_constraint('uq_metrics_experiment_epoch', 'metrics', ['experiment_id', 'epoch'])
+    op.create_unique_constraint('uq_resource_usage_experiment_epoch', 'resource_usage', ['experiment_id', 'epoch'])
+
+    op.create_table(
+        'idempotency_keys',
+        sa.Column('key', sa.String(), primary_key=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), primary_key=True),
+        sa.Column('route', sa.String()),
+        sa.Column('response', sa.JSON()),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.func.now())
+    )
+    op.create_index(op.f('ix_idempotency_keys_created_at'), 'idempotency_keys', ['created_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_idempotency_keys_created_at'), table_name='idempotency_keys')
+    op.drop_table('idempotency_keys')
+    op.drop_constraint('uq_resource_usage_experiment_epoch', 'resource_usage', type_='unique')
+    op.drop_constraint('uq_metrics_experiment_epoch', 'metrics', type_='unique')
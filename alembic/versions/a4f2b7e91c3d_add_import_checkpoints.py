@@ -0,0 +1,34 @@
+"""add import checkpoints
+
+Revision ID: a4f2b7e91c3d
+Revises: 7d3c1f9a2e45
+Create Date: 2026-10-19 16:22:05.631870
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4f2b7e91c3d'
+down_revision: Union[str, None] = '7d3c1f9a2e45'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    op.create_table(
+        'import_checkpoints',
+        sa.Column('source', sa.String(), primary_key=True),
+        sa.Column('fingerprint', sa.String()),
+        sa.Column('rows_done', sa.BigInteger(), server_default='0'),
+        sa.Column('started_at', sa.DateTime(), server_default=sa.func.now()),
+        sa.Column('updated_at', sa.DateTime(), server_default=sa.func.now()),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+    )
+
+
+def downgrade():
+    op.drop_table('import_checkpoints')
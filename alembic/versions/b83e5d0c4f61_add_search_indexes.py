@@ -0,0 +1,42 @@
+"""add search indexes
+
+Revision ID: b83e5d0c4f61
+Revises: a4f2b7e91c3d
+Create Date: 2026-10-19 17:05:48.402913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b83e5d0c4f61'
+down_revision: Union[str, None] = 'a4f2b7e91c3d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ('experiments', 'projects')
+
+
+def upgrade():
+    # Trigram and full-text indexes are PostgreSQL-only; search.py falls back to LIKE elsewhere
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table in TABLES:
+        op.execute(f'CREATE INDEX IF NOT EXISTS ix_{table}_name_trgm ON {table} USING gin (name gin_trgm_ops)')
+        # Same expression as search.py, otherwise the planner can't use the index
+        op.execute(
+            f"CREATE INDEX IF NOT EXISTS ix_{table}_description_fts ON {table} "
+            f"USING gin (to_tsvector('english'::regconfig, coalesce(description, '')))"
+        )
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for table in TABLES:
+        op.execute(f'DROP INDEX IF EXISTS ix_{table}_description_fts')
+        op.execute(f'DROP INDEX IF EXISTS ix_{table}_name_trgm')
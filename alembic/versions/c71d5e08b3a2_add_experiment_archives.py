@@ -0,0 +1,37 @@
+"""add experiment_archives table and experiments.archived_at
+
+Revision ID: c71d5e08b3a2
+Revises: 9a4e61c0d2f8
+Create Date: 2026-10-19 12:20:07.550391
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c71d5e08b3a2'
+down_revision: Union[str, None] = '9a4e61c0d2f8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    op.add_column('experiments', sa.Column('archived_at', sa.DateTime(), nullable=True))
+    op.create_table(
+        'experiment_archives',
+        sa.Column('experiment_id', sa.Integer(), sa.ForeignKey('experiments.id'), primary_key=True),
+        sa.Column('codec', sa.String()),
+        sa.Column('metrics_blob', sa.LargeBinary()),
+        sa.Column('resource_usage_blob', sa.LargeBinary()),
+        sa.Column('metric_count', sa.Integer()),
+        sa.Column('resource_usage_count', sa.Integer()),
+        sa.Column('archived_at', sa.DateTime(), server_default=sa.func.now())
+    )
+
+
+def downgrade():
+    op.drop_table('experiment_archives')
+    op.drop_column('experiments', 'archived_at')
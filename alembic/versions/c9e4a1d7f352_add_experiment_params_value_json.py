@@ -0,0 +1,28 @@
+"""add experiment_params.value_json
+
+Revision ID: c9e4a1d7f352
+Revises: b83e5d0c4f61
+Create Date: 2026-10-19 18:41:37.902214
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c9e4a1d7f352'
+down_revision: Union[str, None] = 'b83e5d0c4f61'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    # Existing lists, dicts and nulls can't be told apart from strings that look like JSON, so they
+    # keep reading back as strings until the hyperparameter is set again
+    op.add_column('experiment_params', sa.Column('value_json', sa.Boolean(), server_default=sa.false()))
+
+
+def downgrade():
+    op.drop_column('experiment_params', 'value_json')
@@ -0,0 +1,26 @@
+"""add users.is_admin
+
+Revision ID: e2a9d4f7c610
+Revises: 5b8f0e2c9d17
+Create Date: 2026-10-19 14:58:10.274455
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2a9d4f7c610'
+down_revision: Union[str, None] = '5b8f0e2c9d17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    op.add_column('users', sa.Column('is_admin', sa.Boolean(), server_default=sa.false()))
+
+
+def downgrade():
+    op.drop_column('users', 'is_admin')
@@ -0,0 +1,156 @@
+import json
+import threading
+import zlib
+from collections import OrderedDict
+from datetime import datetime
+
+from sqlalchemy.orm import Session, load_only
+
+from models import Experiment, ExperimentArchive, Metric, ResourceUsage
+from rollups import lock_summary
+
+CODEC = "zlib+json-columnar-v1"
+COMPRESSION_LEVEL = 9
+
+METRIC_COLUMNS = ("epoch", "accuracy", "precision", "recall", "loss", "timestamp")
+RESOURCE_USAGE_COLUMNS = ("epoch", "cpu_usage_percent", "memory_usage_mb", "gpu_usage_percent",
+                          "gpu_memory_usage_mb", "training_time_sec", "timestamp")
+
+# Decoded archived series, keyed by (experiment_id, kind); archives are immutable so entries never go stale
+SERIES_CACHE_SIZE = 256
+_series_cache = OrderedDict()
+_series_cache_lock = threading.Lock()
+
+
+def pack_series(rows, columns) -> bytes:
+    """Pack row tuples into one zlib-compressed blob holding a list of values per column."""
+    data = {column: [] for column in columns}
+    for row in rows:
+        for column, value in zip(columns, row):
+            data[column].append(value.isoformat() if isinstance(value, datetime) else value)
+    return zlib.compress(json.dumps({"columns": list(columns), "data": data}).encode(), COMPRESSION_LEVEL)
+
+
+def unpack_series(blob: bytes) -> list:
+    """Inverse of pack_series: a list of row dicts."""
+    if not blob:
+        return []
+    payload = json.loads(zlib.decompress(blob))
+    columns = payload["columns"]
+    data = payload["data"]
+    if "timestamp" in data:
+        data["timestamp"] = [datetime.fromisoformat(v) if v else None for v in data["timestamp"]]
+    return [dict(zip(columns, values)) for values in zip(*(data[c] for c in columns))]
+
+
+def archive_experiment(db: Session, experiment: Experiment) -> bool:
+    """Move an experiment's per-epoch rows into a compressed archive. The caller commits.
+
+    Returns False if the experiment was already archived.
+    """
+    if experiment.archived_at:
+        return False
+    # Ingest routes share-lock the row (see lock_for_ingest), so nothing can be written between
+    # packing the rows and deleting them; a concurrent archive call waits here and then sees archived_at
+    db.query(Experiment).filter(Experiment.id == experiment.id).with_for_update().populate_existing().one()
+    if experiment.archived_at:
+        return False
+
+    # Make sure the resource rollup exists before its source rows go away
+    lock_summary(db, experiment.id)
+
+    metric_rows = db.query(*[getattr(Metric, c) for c in METRIC_COLUMNS]).filter(
+        Metric.experiment_id == experiment.id
+    ).order_by(Metric.epoch).all()
+    resource_rows = db.query(*[getattr(ResourceUsage, c) for c in RESOURCE_USAGE_COLUMNS]).filter(
+        ResourceUsage.experiment_id == experiment.id
+    ).order_by(ResourceUsage.epoch).all()
+
+    db.add(ExperimentArchive(
+        experiment_id=experiment.id,
+        codec=CODEC,
+        metrics_blob=pack_series(metric_rows, METRIC_COLUMNS),
+        resource_usage_blob=pack_series(resource_rows, RESOURCE_USAGE_COLUMNS),
+        metric_count=len(metric_rows),
+        resource_usage_count=len(resource_rows),
+    ))
+    db.query(Metric).filter(Metric.experiment_id == experiment.id).delete(synchronize_session=False)
+    db.query(ResourceUsage).filter(ResourceUsage.experiment_id == experiment.id).delete(synchronize_session=False)
+    experiment.archived_at = datetime.utcnow()
+    return True
+
+
+def lock_for_ingest(db: Session, experiment_id: int, user_id: int):
+    """Fetch an experiment that rows are about to be written for, share-locked until commit.
+
+    Concurrent ingests don't block each other, but archive_experiment waits for them and they
+    wait for it, so archived_at is checked against the committed state. Returns None if the
+    experiment doesn't exist or isn't the user's.
+    """
+    return db.query(Experiment).filter_by(id=experiment_id, user_id=user_id).with_for_update(read=True).first()
+
+
+def forget_archive(experiment_id: int):
+    with _series_cache_lock:
+        for kind in ("metrics", "resource_usage"):
+            _series_cache.pop((experiment_id, kind), None)
+
+
+def _load_archived(db: Session, experiment_ids, kind: str) -> dict:
+    result = {}
+    with _series_cache_lock:
+        for experiment_id in experiment_ids:
+            rows = _series_cache.get((experiment_id, kind))
+            if rows is not None:
+                _series_cache.move_to_end((experiment_id, kind))
+                result[experiment_id] = rows
+    missing = [experiment_id for experiment_id in experiment_ids if experiment_id not in result]
+    if not missing:
+        return result
+
+    blob_column = ExperimentArchive.metrics_blob if kind == "metrics" else ExperimentArchive.resource_usage_blob
+    archives = db.query(ExperimentArchive).options(
+        load_only(ExperimentArchive.experiment_id, blob_column)
+    ).filter(ExperimentArchive.experiment_id.in_(missing)).all()
+    for archive in archives:
+        result[archive.experiment_id] = unpack_series(getattr(archive, blob_column.key))
+
+    with _series_cache_lock:
+        for experiment_id in missing:
+            _series_cache[(experiment_id, kind)] = result.setdefault(experiment_id, [])
+        while len(_series_cache) > SERIES_CACHE_SIZE:
+            _series_cache.popitem(last=False)
+    return result
+
+
+def load_metrics(db: Session, experiments) -> dict:
+    """Metrics per experiment id, ordered by epoch, whether the experiment is live or archived.
+
+    Archived series come back as transient Metric objects (never added to the session), so
+    callers and response serialization treat both cases the same.
+    """
+    series = {exp.id: [] for exp in experiments}
+    live_ids = [exp.id for exp in experiments if not exp.archived_at]
+    archived_ids = [exp.id for exp in experiments if exp.archived_at]
+
+    if live_ids:
+        for metric in db.query(Metric).filter(Metric.experiment_id.in_(live_ids)).order_by(Metric.epoch):
+            series[metric.experiment_id].append(metric)
+    for experiment_id, rows in _load_archived(db, archived_ids, "metrics").items():
+        series[experiment_id] = [Metric(experiment_id=experiment_id, **row) for row in rows]
+    return series
+
+
+def load_resource_usage(db: Session, experiments) -> dict:
+    """Resource usage per experiment id, ordered by epoch; see load_metrics."""
+    series = {exp.id: [] for exp in experiments}
+    live_ids = [exp.id for exp in experiments if not exp.archived_at]
+    archived_ids = [exp.id for exp in experiments if exp.archived_at]
+
+    if live_ids:
+        rows = db.query(ResourceUsage).filter(ResourceUsage.experiment_id.in_(live_ids)).order_by(ResourceUsage.epoch)
+        for usage in rows:
+            series[usage.experiment_id].append(usage)
+    for experiment_id, rows in _load_archived(db, archived_ids, "resource_usage").items():
+        series[experiment_id] = [ResourceUsage(experiment_id=experiment_id, **row) for row in rows]
+    return series
@@ -1,3 +1,10 @@
+import asyncio
+import hashlib
+import multiprocessing
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 from jose import jwt, JWTError
 from passlib.context import CryptContext
@@ -11,6 +18,14 @@ SECRET_KEY = "2v9dD0iCv2Vh0z2nFxQk0sYcM2c5Jm8xZbNqYF6lzF0vCJXUMX9x0G_jTXsDdD8k"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
 
+# bcrypt runs in a small process pool so login bursts don't occupy the request threadpool
+HASH_WORKERS = 2
+MAX_PENDING_HASHES = 32
+
+# Verified JWT payloads are reused until the token expires or the TTL elapses
+TOKEN_CACHE_TTL_SECONDS = 60
+TOKEN_CACHE_MAX_SIZE = 10000
+
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/token")
 
@@ -23,6 +38,55 @@ def verify_password(plain_password: str, hashed_password: str):
     return pwd_context.verify(plain_password, hashed_password)
 
 
+_hash_pool = None
+_pending_hashes = 0
+
+
+def _get_hash_pool():
+    global _hash_pool
+    if _hash_pool is None:
+        # spawn, not fork: by the time the pool exists the server runs other threads, and a forked
+        # child could inherit a lock one of them held, as well as the pooled database sockets
+        _hash_pool = ProcessPoolExecutor(max_workers=HASH_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _hash_pool
+
+
+async def start_hash_pool():
+    """Start the bcrypt workers at application startup, so the first logins don't pay for it."""
+    loop = asyncio.get_running_loop()
+    pool = _get_hash_pool()
+    # One hash per worker imports passlib/bcrypt in each of them
+    await asyncio.gather(*(loop.run_in_executor(pool, get_password_hash, "warm-up") for _ in range(HASH_WORKERS)))
+
+
+def stop_hash_pool():
+    global _hash_pool
+    if _hash_pool is not None:
+        _hash_pool.shutdown(wait=True, cancel_futures=True)
+        _hash_pool = None
+
+
+async def _run_in_hash_pool(fn, *args):
+    global _pending_hashes
+    # Only touched from the event loop thread, so no lock is needed
+    if _pending_hashes >= MAX_PENDING_HASHES:
+        raise HTTPException(status_code=503, detail="Too many concurrent logins, retry shortly",
+                            headers={"Retry-After": "1"})
+    _pending_hashes += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_get_hash_pool(), fn, *args)
+    finally:
+        _pending_hashes -= 1
+
+
+async def get_password_hash_async(password: str):
+    return await _run_in_hash_pool(get_password_hash, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str):
+    return await _run_in_hash_pool(verify_password, plain_password, hashed_password)
+
+
 def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
@@ -30,9 +94,33 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
+_token_cache = OrderedDict()
+_token_cache_lock = threading.Lock()
+
+
+def decode_access_token(token: str) -> dict:
+    """jwt.decode with a short-lived cache keyed by the token's hash. Raises JWTError."""
+    key = hashlib.sha256(token.encode()).hexdigest()
+    now = time.time()
+    with _token_cache_lock:
+        entry = _token_cache.get(key)
+        if entry and entry[1] > now:
+            _token_cache.move_to_end(key)
+            return entry[0]
+
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    expires_at = min(payload.get("exp", now), now + TOKEN_CACHE_TTL_SECONDS)
+    with _token_cache_lock:
+        _token_cache[key] = (payload, expires_at)
+        _token_cache.move_to_end(key)
+        while len(_token_cache) > TOKEN_CACHE_MAX_SIZE:
+            _token_cache.popitem(last=False)
+    return payload
+
+
 def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_access_token(token)
         user_id = int(payload.get("sub"))
         user = db.query(User).get(user_id)
         if not user:
@@ -40,3 +128,9 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
         return user
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
+
+
+def get_current_admin(current_user: User = Depends(get_current_user)):
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return current_user
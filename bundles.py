@@ -0,0 +1,73 @@
+import os
+import tarfile
+import zipfile
+
+CHUNK_SIZE = 1024 * 1024
+MEDIA_TYPES = {"zip": "application/zip", "tar": "application/x-tar"}
+
+
+class _ChunkSink:
+    """Write-only file object that hands written bytes back to the generator driving it.
+
+    It has no tell()/seek(), so zipfile falls back to streaming mode (data descriptors after
+    each member) and never needs to rewind.
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def stream_zip(entries):
+    """Yield a ZIP archive of (arcname, path) entries chunk by chunk, holding at most one chunk in memory."""
+    sink = _ChunkSink()
+    # Checkpoints are already dense binary; storing them is much cheaper than deflating
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        for arcname, path in entries:
+            info = zipfile.ZipInfo.from_file(path, arcname)
+            with open(path, "rb") as src, archive.open(info, mode="w") as dest:
+                while chunk := src.read(CHUNK_SIZE):
+                    dest.write(chunk)
+                    yield sink.drain()
+            yield sink.drain()
+    yield sink.drain()
+
+
+def stream_tar(entries):
+    """Yield an uncompressed tar archive of (arcname, path) entries chunk by chunk."""
+    for arcname, path in entries:
+        stat = os.stat(path)
+        info = tarfile.TarInfo(arcname)
+        info.size = stat.st_size
+        info.mtime = int(stat.st_mtime)
+        info.mode = 0o644
+        yield info.tobuf(format=tarfile.PAX_FORMAT)
+        with open(path, "rb") as src:
+            while chunk := src.read(CHUNK_SIZE):
+                yield chunk
+        remainder = stat.st_size % tarfile.BLOCKSIZE
+        if remainder:
+            yield tarfile.NUL * (tarfile.BLOCKSIZE - remainder)
+    # End-of-archive marker: two zero blocks
+    yield tarfile.NUL * (2 * tarfile.BLOCKSIZE)
+
+
+def checkpoint_arcname(experiment_name: str, version: int, file_path: str) -> str:
+    # Stored files are named "<version or experiment id>_<original name>"; keep only the original name
+    original_name = os.path.basename(file_path).split("_", 1)[-1]
+    return f"{experiment_name}/v{version}_{original_name}"
+
+
+def stream_bundle(entries, fmt: str):
+    return stream_zip(entries) if fmt == "zip" else stream_tar(entries)
@@ -0,0 +1,308 @@
+"""Python client for the ML Insights Hub upload API.
+
+Metric and resource-usage points are buffered in memory and shipped by a
+background thread in gzip-compressed batches over one keep-alive session, so
+`log_metrics` / `log_resource_usage` return immediately inside a training loop.
+Batches that cannot be delivered are spilled to a local JSON-lines spool file
+and replayed once the server is reachable again.
+
+    with TrackingClient("http://localhost:8000", api_key) as tracker:
+        project_id = tracker.create_project("resnet", "baseline runs")
+        experiment_id = tracker.create_experiment(project_id, "lr=0.01")
+        for epoch in range(epochs):
+            ...
+            tracker.log_metrics(experiment_id, epoch, accuracy, precision, recall, loss)
+        tracker.upload_model(experiment_id, "model.pt")
+"""
+import atexit
+import gzip
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS = {429, 502, 503, 504}
+
+
+class TrackingClient:
+    def __init__(self, base_url, api_key, batch_size=500, flush_interval=2.0, max_buffer=100_000,
+                 spool_path="mlhub_spool.jsonl", compress=True, max_retries=5, backoff=0.5, timeout=10):
+        self.base_url = base_url.rstrip("/")
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.spool_path = spool_path
+        self.compress = compress
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        self.session.headers.update({"X-API-Key": api_key})
+        self.session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+
+        # deque.append is atomic; the lock below only guards two counters, so the training thread
+        # never waits on network I/O
+        self._buffer = deque()
+        self._wakeup = threading.Event()
+        # flush() waits until every point enqueued before it was delivered, dropped or spilled
+        self._progress = threading.Condition()
+        self._enqueued = 0
+        self._handled = 0
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, name="mlhub-uploader", daemon=True)
+        self._worker.start()
+        atexit.register(self.close)
+
+    # Synchronous calls: the caller needs the returned ids
+
+    def create_project(self, name, description=""):
+        response = self._request("POST", "/projects", params={"name": name, "description": description})
+        return response.json()["project_id"]
+
+    def create_experiment(self, project_id, description="", hyperparameters=None, tags=None):
+        body = {"hyperparameters": hyperparameters or {}, "tags": list(tags or [])}
+        response = self._request("POST", "/experiments",
+                                 params={"project_id": project_id, "description": description}, json=body)
+        return response.json()["experiment_id"]
+
+    def set_metadata(self, experiment_id, hyperparameters=None, tags=None):
+        """Add or overwrite hyperparameters and add tags of an existing experiment."""
+        self._request("POST", f"/experiments/{experiment_id}/metadata",
+                      json={"hyperparameters": hyperparameters or {}, "tags": list(tags or [])})
+
+    # Buffered calls: return immediately. Values are converted here, so numpy/torch scalars are
+    # serializable and bad input fails in the caller instead of in the uploader thread
+
+    def log_metrics(self, experiment_id, epoch, accuracy, precision, recall, loss):
+        self._enqueue("metrics", experiment_id, {
+            "epoch": int(epoch), "accuracy": float(accuracy), "precision": float(precision),
+            "recall": float(recall), "loss": float(loss),
+        })
+
+    def log_resource_usage(self, experiment_id, epoch, cpu_usage_percent=None, memory_usage_mb=None,
+                           gpu_usage_percent=None, gpu_memory_usage_mb=None, training_time_sec=None):
+        self._enqueue("resource-usage", experiment_id, {
+            "epoch": int(epoch),
+            "cpu_usage_percent": _optional_float(cpu_usage_percent),
+            "memory_usage_mb": _optional_float(memory_usage_mb),
+            "gpu_usage_percent": _optional_float(gpu_usage_percent),
+            "gpu_memory_usage_mb": _optional_float(gpu_memory_usage_mb),
+            "training_time_sec": _optional_float(training_time_sec),
+        })
+
+    def upload_model(self, experiment_id, path, epoch=None, is_best=False, metadata=None):
+        """Queue a checkpoint upload; every call creates a new version on the server."""
+        self._enqueue("model", experiment_id, {
+            "path": os.path.abspath(path), "epoch": None if epoch is None else int(epoch),
+            "is_best": bool(is_best), "metadata": metadata,
+        })
+
+    def flush(self, timeout=None):
+        """Block until everything buffered so far has been sent or spilled; False on timeout."""
+        with self._progress:
+            target = self._enqueued
+            self._wakeup.set()
+            return self._progress.wait_for(lambda: self._handled >= target, timeout)
+
+    def close(self, timeout=30):
+        if self._closed:
+            return
+        self._closed = True
+        self._wakeup.set()
+        self._worker.join(timeout)
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # Background side
+
+    def _enqueue(self, kind, experiment_id, payload):
+        if self._closed:
+            raise RuntimeError("TrackingClient is closed")
+        with self._progress:
+            self._buffer.append((kind, experiment_id, payload))
+            self._enqueued += 1
+        if len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            closing = self._closed
+            try:
+                self._drain()
+                self._replay_spool()
+            except Exception:
+                logger.exception("Unexpected error in uploader thread")
+            if closing:
+                return
+
+    def _mark_handled(self, count):
+        with self._progress:
+            self._handled += count
+            self._progress.notify_all()
+
+    def _drain(self):
+        # Items count as handled once popped, even if spilling them fails, so flush() always returns
+        while len(self._buffer) > self.max_buffer:
+            overflow = [self._buffer.popleft() for _ in range(len(self._buffer) - self.max_buffer)]
+            try:
+                self._spill(overflow)
+            finally:
+                self._mark_handled(len(overflow))
+
+        while self._buffer:
+            items = []
+            while self._buffer and len(items) < self.batch_size:
+                items.append(self._buffer.popleft())
+            rest = []
+            try:
+                failed = self._send(items)
+                if failed:
+                    rest = list(self._drain_all())
+                    self._spill(failed + rest)
+                    return
+            finally:
+                self._mark_handled(len(items) + len(rest))
+
+    def _drain_all(self):
+        while self._buffer:
+            yield self._buffer.popleft()
+
+    def _send(self, items):
+        """Send items grouped into batches; return the items that could not be delivered."""
+        groups = {}
+        for kind, experiment_id, payload in items:
+            groups.setdefault((kind, experiment_id), []).append(payload)
+
+        failed = []
+        for (kind, experiment_id), payloads in groups.items():
+            try:
+                if kind == "model":
+                    for payload in payloads:
+                        if not self._deliver(kind, experiment_id, [payload]):
+                            failed.append((kind, experiment_id, payload))
+                elif not self._deliver(kind, experiment_id, payloads):
+                    failed.extend((kind, experiment_id, p) for p in payloads)
+            except Exception:
+                # A bug or bad data, not an outage: retrying from the spool would fail the same way
+                logger.exception("Dropping %d %s points for experiment %s", len(payloads), kind, experiment_id)
+        return failed
+
+    def _deliver(self, kind, experiment_id, payloads):
+        try:
+            if kind == "model":
+                self._send_model(experiment_id, payloads[0])
+            else:
+                self._send_json(f"/{kind}/batch", {"experiment_id": experiment_id, "points": payloads})
+        except requests.HTTPError as e:
+            if e.response is not None and e.response.status_code in RETRYABLE_STATUS:
+                return False
+            # The server rejected the data itself; spooling it for later won't help
+            logger.error("Dropping %d %s points for experiment %s: %s",
+                         len(payloads), kind, experiment_id, e.response.text if e.response is not None else e)
+        except requests.RequestException:
+            return False
+        return True
+
+    def _send_json(self, path, body):
+        data = json.dumps(body).encode()
+        # Same key on every retry of this batch, so the server applies it at most once
+        headers = {"Content-Type": "application/json", "Idempotency-Key": str(uuid.uuid4())}
+        if self.compress:
+            data = gzip.compress(data, compresslevel=5)
+            headers["Content-Encoding"] = "gzip"
+        return self._request("POST", path, data=data, headers=headers)
+
+    def _send_model(self, experiment_id, payload):
+        path = payload["path"]
+        if not os.path.exists(path):
+            logger.error("Model file %s no longer exists, skipping upload", path)
+            return
+        params = {"experiment_id": experiment_id, "is_best": payload.get("is_best", False)}
+        if payload.get("epoch") is not None:
+            params["epoch"] = payload["epoch"]
+        if payload.get("metadata") is not None:
+            params["metadata"] = json.dumps(payload["metadata"])
+        with open(path, "rb") as f:
+            self._request("POST", "/upload_model", params=params,
+                          files={"file": (os.path.basename(path), f)}, rewind=f)
+
+    def _request(self, method, path, rewind=None, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            try:
+                if rewind is not None:
+                    rewind.seek(0)
+                response = self.session.request(method, self.base_url + path, timeout=self.timeout, **kwargs)
+                if response.status_code not in RETRYABLE_STATUS:
+                    response.raise_for_status()
+                    return response
+                if attempt == self.max_retries:
+                    response.raise_for_status()
+                delay = _retry_after(response) or self._delay(attempt)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.max_retries:
+                    raise
+                delay = self._delay(attempt)
+            time.sleep(delay)
+
+    def _delay(self, attempt):
+        return self.backoff * (2 ** attempt) * (0.5 + random.random())
+
+    # Spool file: one JSON object per undelivered point
+
+    def _spill(self, items):
+        if not items:
+            return
+        logger.warning("Server unreachable, spooling %d points to %s", len(items), self.spool_path)
+        with open(self.spool_path, "a") as f:
+            for kind, experiment_id, payload in items:
+                f.write(json.dumps({"kind": kind, "experiment_id": experiment_id, "payload": payload}) + "\n")
+
+    def _replay_spool(self):
+        if not os.path.exists(self.spool_path) or self._buffer:
+            return
+        replay_path = self.spool_path + ".replay"
+        if not os.path.exists(replay_path):
+            os.replace(self.spool_path, replay_path)
+
+        with open(replay_path) as f:
+            records = [json.loads(line) for line in f if line.strip()]
+        items = [(r["kind"], r["experiment_id"], r["payload"]) for r in records]
+
+        for start in range(0, len(items), self.batch_size):
+            failed = self._send(items[start:start + self.batch_size])
+            if failed:
+                self._spill(failed + items[start + self.batch_size:])
+                break
+        else:
+            logger.info("Replayed %d spooled points from %s", len(items), self.spool_path)
+        os.remove(replay_path)
+
+
+def _optional_float(value):
+    return None if value is None else float(value)
+
+
+def _retry_after(response):
+    """Seconds from a numeric Retry-After header; 0 if missing or an HTTP date."""
+    try:
+        return max(0.0, float(response.headers.get("Retry-After", 0)))
+    except ValueError:
+        return 0
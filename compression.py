@@ -0,0 +1,237 @@
+import zlib
+
+import brotli
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import PlainTextResponse
+
+# Request bodies may only be compressed on the JSON ingest routes
+INGEST_PATHS = {
+    "/projects",
+    "/experiments",
+    "/metrics",
+    "/metrics/batch",
+    "/resource-usage",
+    "/resource-usage/batch",
+}
+MAX_DECOMPRESSED_SIZE = 16 * 1024 * 1024
+MINIMUM_SIZE = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "image/svg+xml")
+
+
+class PayloadTooLarge(Exception):
+    pass
+
+
+def _parse_accept_encoding(value: str):
+    accepted = {}
+    for part in value.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            accepted[name.strip().lower()] = q
+    return accepted
+
+
+def negotiate_encoding(accept_encoding: str):
+    accepted = _parse_accept_encoding(accept_encoding)
+    for encoding in ("br", "gzip"):
+        if accepted.get(encoding, accepted.get("*", 0)) > 0:
+            return encoding
+    return None
+
+
+def decompress_body(body: bytes, encoding: str, limit: int = MAX_DECOMPRESSED_SIZE) -> bytes:
+    out = bytearray()
+    if encoding == "gzip":
+        decompressor = zlib.decompressobj(wbits=47)  # gzip or zlib header
+        data = body
+        while data and not decompressor.eof:
+            out += decompressor.decompress(data, limit + 1 - len(out))
+            if len(out) > limit:
+                raise PayloadTooLarge()
+            data = decompressor.unconsumed_tail
+        if not decompressor.eof:
+            raise zlib.error("truncated gzip stream")
+    elif encoding == "br":
+        # A few input bytes can expand to megabytes in one brotli command, so slicing the input
+        # doesn't bound memory; cap the output of every call instead and drain it step by step
+        decompressor = brotli.Decompressor()
+        data = body
+        while True:
+            chunk = decompressor.process(data, output_buffer_limit=limit + 1 - len(out))
+            data = b""
+            out += chunk
+            if len(out) > limit:
+                raise PayloadTooLarge()
+            if not chunk or decompressor.is_finished():
+                break
+        if not decompressor.is_finished():
+            raise brotli.error("truncated brotli stream")
+    else:
+        raise ValueError(encoding)
+    return bytes(out)
+
+
+class _Compressor:
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._c = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._c = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._c.process(data) + self._c.flush()
+        return self._c.compress(data) + self._c.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        if self.encoding == "br":
+            return self._c.process(data) + self._c.finish()
+        return self._c.compress(data) + self._c.flush()
+
+
+class CompressionMiddleware:
+    """Negotiated gzip/brotli response compression plus compressed request bodies on ingest routes."""
+
+    def __init__(self, app, minimum_size: int = MINIMUM_SIZE, max_decompressed_size: int = MAX_DECOMPRESSED_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.max_decompressed_size = max_decompressed_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        content_encoding = headers.get("content-encoding", "identity").strip().lower()
+        if content_encoding != "identity":
+            if scope["path"] not in INGEST_PATHS or content_encoding not in ("gzip", "br"):
+                response = PlainTextResponse("Unsupported Content-Encoding", status_code=415)
+                await response(scope, receive, send)
+                return
+            try:
+                scope, receive = await self._decompress_request(scope, receive, content_encoding)
+            except PayloadTooLarge:
+                response = PlainTextResponse("Decompressed body too large", status_code=413)
+                await response(scope, receive, send)
+                return
+            except (zlib.error, brotli.error):
+                response = PlainTextResponse("Malformed compressed body", status_code=400)
+                await response(scope, receive, send)
+                return
+
+        encoding = negotiate_encoding(headers.get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await _CompressingResponder(self.app, encoding, self.minimum_size)(scope, receive, send)
+
+    async def _decompress_request(self, scope, receive, encoding):
+        chunks = []
+        received = 0
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                break
+            chunks.append(message.get("body", b""))
+            received += len(chunks[-1])
+            if received > self.max_decompressed_size:
+                raise PayloadTooLarge()
+            more_body = message.get("more_body", False)
+
+        body = decompress_body(b"".join(chunks), encoding, self.max_decompressed_size)
+
+        raw_headers = [(k, v) for k, v in scope["headers"] if k not in (b"content-encoding", b"content-length")]
+        raw_headers.append((b"content-length", str(len(body)).encode()))
+        scope = dict(scope, headers=raw_headers)
+
+        sent = False
+
+        async def replay():
+            nonlocal sent
+            if sent:
+                return await receive()
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        return scope, replay
+
+
+class _CompressingResponder:
+    def __init__(self, app, encoding, minimum_size):
+        self.app = app
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.send = None
+        self.start_message = None
+        self.compressor = None
+        self.passthrough = False
+
+    async def __call__(self, scope, receive, send):
+        self.send = send
+        await self.app(scope, receive, self.send_with_compression)
+
+    async def send_with_compression(self, message):
+        message_type = message["type"]
+        if message_type == "http.response.start":
+            # Defer the headers until the first body chunk tells us whether to compress
+            self.start_message = message
+            headers = Headers(raw=message["headers"])
+            content_type = headers.get("content-type", "")
+            self.passthrough = (
+                "content-encoding" in headers
+                or message["status"] in (204, 304)
+                or not content_type.startswith(COMPRESSIBLE_TYPES)
+            )
+            return
+
+        if message_type != "http.response.body" or self.passthrough:
+            if self.start_message is not None:
+                await self.send(self.start_message)
+                self.start_message = None
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.start_message is not None:
+            start, self.start_message = self.start_message, None
+            if not more_body and len(body) < self.minimum_size:
+                await self.send(start)
+                await self.send(message)
+                self.passthrough = True
+                return
+
+            self.compressor = _Compressor(self.encoding)
+            headers = MutableHeaders(raw=start["headers"])
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            if more_body:
+                del headers["Content-Length"]
+                await self.send(start)
+                await self.send({"type": "http.response.body", "body": self.compressor.compress(body),
+                                 "more_body": True})
+            else:
+                body = self.compressor.finish(body)
+                headers["Content-Length"] = str(len(body))
+                await self.send(start)
+                await self.send({"type": "http.response.body", "body": body})
+            return
+
+        if more_body:
+            await self.send({"type": "http.response.body", "body": self.compressor.compress(body), "more_body": True})
+        else:
+            await self.send({"type": "http.response.body", "body": self.compressor.finish(body)})
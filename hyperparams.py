@@ -0,0 +1,196 @@
+import json
+import re
+
+from sqlalchemy import and_, exists, not_, or_
+from sqlalchemy.orm import Session
+
+from models import Experiment, ExperimentParam, ExperimentTag
+
+_TOKEN = re.compile(r"""
+    \s*(?:
+        (?P<lparen>\() | (?P<rparen>\)) |
+        (?P<op><=|>=|!=|=|<|>) |
+        (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*') |
+        (?P<word>[A-Za-z0-9_.:+\-/]+)
+    )""", re.VERBOSE)
+
+
+def _param_values(value):
+    """Map a hyperparameter value to its (value_text, value_num, value_json) columns.
+
+    Numbers and booleans keep their JSON spelling in value_text so they round-trip with their type;
+    lists, dicts and None are stored as JSON text, flagged by value_json, and only support string
+    comparison.
+    """
+    if isinstance(value, (bool, int, float)):
+        return json.dumps(value), float(value), False
+    if isinstance(value, str):
+        return value, None, False
+    return json.dumps(value, sort_keys=True), None, True
+
+
+def _param_value(param: ExperimentParam):
+    if param.value_num is not None or param.value_json:
+        return json.loads(param.value_text)
+    return param.value_text
+
+
+def set_hyperparameters(db: Session, experiment_id: int, hyperparameters: dict):
+    """Add or overwrite hyperparameters of an experiment. The caller commits."""
+    existing = {p.key: p for p in db.query(ExperimentParam).filter_by(experiment_id=experiment_id)}
+    for key, value in hyperparameters.items():
+        value_text, value_num, value_json = _param_values(value)
+        param = existing.get(key) or ExperimentParam(experiment_id=experiment_id, key=key)
+        param.value_text = value_text
+        param.value_num = value_num
+        param.value_json = value_json
+        db.add(param)
+
+
+def add_tags(db: Session, experiment_id: int, tags):
+    existing = {t for (t,) in db.query(ExperimentTag.tag).filter_by(experiment_id=experiment_id)}
+    db.add_all([ExperimentTag(experiment_id=experiment_id, tag=tag) for tag in set(tags) - existing])
+
+
+def load_params_and_tags(db: Session, experiment_ids):
+    """Hyperparameters and tags for many experiments in two queries."""
+    params = {experiment_id: {} for experiment_id in experiment_ids}
+    tags = {experiment_id: [] for experiment_id in experiment_ids}
+    if not experiment_ids:
+        return params, tags
+    for param in db.query(ExperimentParam).filter(ExperimentParam.experiment_id.in_(experiment_ids)):
+        params[param.experiment_id][param.key] = _param_value(param)
+    for experiment_id, tag in db.query(ExperimentTag.experiment_id, ExperimentTag.tag).filter(
+        ExperimentTag.experiment_id.in_(experiment_ids)
+    ).order_by(ExperimentTag.tag):
+        tags[experiment_id].append(tag)
+    return params, tags
+
+
+def _tokenize(text: str):
+    tokens = []
+    pos = 0
+    text = text.rstrip()
+    while pos < len(text):
+        match = _TOKEN.match(text, pos)
+        if not match:
+            raise ValueError(f"Unexpected input at position {pos}: {text[pos:pos + 10]!r}")
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == "string":
+            value = re.sub(r"\\(.)", r"\1", value[1:-1])
+        elif kind == "word" and value.upper() in ("AND", "OR", "NOT"):
+            kind = value.upper()
+        tokens.append((kind, value))
+        pos = match.end()
+    return tokens
+
+
+def _number(value: str):
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def _compare(column, op, value):
+    return {
+        "=": column == value, "!=": column != value,
+        "<": column < value, "<=": column <= value,
+        ">": column > value, ">=": column >= value,
+    }[op]
+
+
+def _condition(key: str, op: str, value: str, quoted: bool):
+    if key == "tag":
+        if op not in ("=", "!="):
+            raise ValueError("tags only support = and !=")
+        has_tag = exists().where(ExperimentTag.experiment_id == Experiment.id, ExperimentTag.tag == value)
+        return has_tag if op == "=" else not_(has_tag)
+
+    if key == "id":
+        if _number(value) is None:
+            raise ValueError(f"id must be a number, got {value!r}")
+        return _compare(Experiment.id, op, int(_number(value)))
+    if key == "name":
+        return _compare(Experiment.name, op, value)
+
+    # Unquoted numbers compare numerically against value_num; everything else against value_text
+    number = None if quoted else _number(value)
+    if value.lower() in ("true", "false") and not quoted:
+        number = 1.0 if value.lower() == "true" else 0.0
+    column = ExperimentParam.value_num if number is not None else ExperimentParam.value_text
+    return exists().where(
+        ExperimentParam.experiment_id == Experiment.id,
+        ExperimentParam.key == key,
+        _compare(column, op, number if number is not None else value),
+    )
+
+
+class _Parser:
+    # expr := term (OR term)* ; term := factor (AND factor)* ;
+    # factor := NOT factor | "(" expr ")" | key op value
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos][0] if self.pos < len(self.tokens) else None
+
+    def take(self, kind):
+        if self.peek() != kind:
+            found = self.tokens[self.pos][1] if self.pos < len(self.tokens) else "end of filter"
+            raise ValueError(f"Expected {kind} but found {found!r}")
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def parse(self):
+        clause = self.expr()
+        if self.peek() is not None:
+            raise ValueError(f"Unexpected {self.tokens[self.pos][1]!r}")
+        return clause
+
+    def expr(self):
+        clauses = [self.term()]
+        while self.peek() == "OR":
+            self.take("OR")
+            clauses.append(self.term())
+        return clauses[0] if len(clauses) == 1 else or_(*clauses)
+
+    def term(self):
+        clauses = [self.factor()]
+        while self.peek() == "AND":
+            self.take("AND")
+            clauses.append(self.factor())
+        return clauses[0] if len(clauses) == 1 else and_(*clauses)
+
+    def factor(self):
+        if self.peek() == "NOT":
+            self.take("NOT")
+            return not_(self.factor())
+        if self.peek() == "lparen":
+            self.take("lparen")
+            clause = self.expr()
+            self.take("rparen")
+            return clause
+        key = self.take("word")[1]
+        op = self.take("op")[1]
+        kind = self.peek()
+        if kind not in ("word", "string"):
+            raise ValueError(f"Expected a value after {key}{op}")
+        value = self.take(kind)[1]
+        return _condition(key, op, value, quoted=kind == "string")
+
+
+def parse_filter(text: str):
+    """Compile a filter such as `lr<0.01 AND optimizer=adam AND tag=baseline` into a SQL clause.
+
+    `tag`, `id` and `name` refer to the experiment itself; any other key is a hyperparameter.
+    Supports =, !=, <, <=, >, >=, AND, OR, NOT and parentheses. Raises ValueError on bad input.
+    """
+    tokens = _tokenize(text)
+    if not tokens:
+        raise ValueError("Empty filter")
+    return _Parser(tokens).parse()
@@ -0,0 +1,398 @@
+"""Offline bulk import of historical runs from CSV and JSON-lines files.
+
+Each source row describes one epoch of one experiment:
+
+    project, experiment, epoch                       required
+    description, project_description                 used when the experiment / project is created
+    accuracy, precision, recall, loss                a metric point if any of them is set
+    cpu_usage_percent, memory_usage_mb, gpu_usage_percent,
+    gpu_memory_usage_mb, training_time_sec           a resource usage point if any of them is set
+    timestamp                                        ISO 8601, defaults to the time of import
+
+Files are loaded in parallel (one worker process per file) with Postgres COPY into temporary
+staging tables, then upserted into metrics / resource_usage in chunks of --chunk-rows rows per
+transaction. Progress is committed in import_checkpoints with every chunk, so rerunning the
+same command resumes where an interrupted import stopped. Resource usage summaries are rebuilt
+once all files are loaded.
+
+    python import_runs.py --user alice --workers 4 runs/*.csv runs/*.jsonl.gz
+"""
+import argparse
+import csv
+import gzip
+import io
+import itertools
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+from sqlalchemy import text
+
+from archive import METRIC_COLUMNS, RESOURCE_USAGE_COLUMNS
+from database import SessionLocal, engine
+from models import Experiment, ImportCheckpoint, Project, ResourceUsageSummary, User
+from rollups import rebuild_resource_summary
+
+logger = logging.getLogger("import_runs")
+
+DEFAULT_CHUNK_ROWS = 100_000
+SUMMARY_COMMIT_EVERY = 200
+# Serializes project/experiment get-or-create between workers (names are not unique in the schema)
+NAMES_LOCK_KEY = 0x6D6C6875
+
+METRIC_FIELDS = METRIC_COLUMNS[1:-1]
+RESOURCE_USAGE_FIELDS = RESOURCE_USAGE_COLUMNS[1:-1]
+
+_STAGING_TABLES = {
+    "metrics": ("import_metrics", METRIC_FIELDS),
+    "resource_usage": ("import_resource_usage", RESOURCE_USAGE_FIELDS),
+}
+
+
+class ImportRejected(Exception):
+    pass
+
+
+def _open(path: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", newline="")
+    return open(path, newline="")
+
+
+def _read_rows(path: str):
+    """Stream the rows of a CSV or JSON-lines file as dicts."""
+    name = path[:-3] if path.endswith(".gz") else path
+    with _open(path) as f:
+        if name.endswith(".csv"):
+            yield from csv.DictReader(f)
+        elif name.endswith((".jsonl", ".ndjson")):
+            for line in f:
+                if line.strip():
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        # Still yield something so the row is rejected and counted, not the whole file aborted
+                        yield {}
+        else:
+            raise ValueError(f"Unsupported file type: {path} (expected .csv, .jsonl or .ndjson)")
+
+
+def _float(value):
+    if value is None or value == "":
+        return None
+    return float(value)
+
+
+def _parse_row(row) -> dict:
+    if not isinstance(row, dict):
+        raise ImportRejected(f"expected an object, got {type(row).__name__}")
+    project = str(row.get("project") or "").strip()
+    experiment = str(row.get("experiment") or "").strip()
+    if not project or not experiment or row.get("epoch") in (None, ""):
+        raise ImportRejected("project, experiment and epoch are required")
+    try:
+        parsed = {
+            "project": project,
+            "experiment": experiment,
+            "description": row.get("description") or "",
+            "project_description": row.get("project_description") or "",
+            "epoch": int(row["epoch"]),
+            "timestamp": datetime.fromisoformat(row["timestamp"]) if row.get("timestamp") else None,
+            "metrics": [_float(row.get(field)) for field in METRIC_FIELDS],
+            "resource_usage": [_float(row.get(field)) for field in RESOURCE_USAGE_FIELDS],
+        }
+    except (TypeError, ValueError) as e:
+        raise ImportRejected(str(e))
+    return parsed
+
+
+def _chunks(path: str, skip: int, chunk_rows: int):
+    """Parse the rows of `path` after the first `skip` in chunks of up to `chunk_rows` rows.
+
+    Yields (first_seq, chunk, rejected): first_seq is the position of the chunk's first row in the
+    file, rejected rows are None in the chunk and listed in `rejected` as (row number, reason).
+    """
+    rows = itertools.islice(_read_rows(path), skip, None)
+    first_seq = skip
+    while True:
+        chunk, rejected = [], []
+        for row in itertools.islice(rows, chunk_rows):
+            try:
+                chunk.append(_parse_row(row))
+            except ImportRejected as e:
+                rejected.append((first_seq + len(chunk) + 1, str(e)))
+                chunk.append(None)
+        if not chunk:
+            return
+        yield first_seq, chunk, rejected
+        first_seq += len(chunk)
+
+
+def _fingerprint(path: str) -> str:
+    stat = os.stat(path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+class _Resolver:
+    """Maps (project, experiment) names to experiment ids for one user, creating what is missing."""
+
+    def __init__(self, db, user_id: int):
+        self.db = db
+        self.user_id = user_id
+        self.projects = {}
+        self.experiments = {}
+        self.archived = set()
+
+    def resolve(self, rows):
+        missing = {}
+        for row in rows:
+            key = (row["project"], row["experiment"])
+            if key not in self.experiments:
+                missing.setdefault(key, row)
+        if not missing:
+            return
+        db = self.db
+        db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": NAMES_LOCK_KEY})
+
+        new_project_rows = {}
+        for (project, _), row in missing.items():
+            if project not in self.projects:
+                new_project_rows.setdefault(project, row)
+        if new_project_rows:
+            # Ordered newest first so the oldest project wins if a name is duplicated
+            for project_id, name in db.query(Project.id, Project.name).filter(
+                Project.user_id == self.user_id, Project.name.in_(new_project_rows)
+            ).order_by(Project.id.desc()):
+                self.projects[name] = project_id
+            new_projects = [Project(name=name, description=row["project_description"], user_id=self.user_id)
+                            for name, row in new_project_rows.items() if name not in self.projects]
+            db.add_all(new_projects)
+            db.flush()
+            self.projects.update({project.name: project.id for project in new_projects})
+
+        project_names = {project_id: name for name, project_id in self.projects.items()}
+        archived = set()
+        for experiment_id, project_id, name, archived_at in db.query(
+            Experiment.id, Experiment.project_id, Experiment.name, Experiment.archived_at
+        ).filter(
+            Experiment.user_id == self.user_id,
+            Experiment.project_id.in_({self.projects[project] for project, _ in missing}),
+            Experiment.name.in_({experiment for _, experiment in missing}),
+        ).order_by(Experiment.id.desc()):
+            key = (project_names[project_id], name)
+            if key in missing:
+                self.experiments[key] = experiment_id
+            if archived_at:
+                archived.add(experiment_id)
+        self.archived |= archived & set(self.experiments.values())
+
+        new_experiments = {
+            key: Experiment(name=key[1], description=row["description"], user_id=self.user_id,
+                            project_id=self.projects[key[0]])
+            for key, row in missing.items() if key not in self.experiments
+        }
+        db.add_all(new_experiments.values())
+        db.flush()
+        self.experiments.update({key: experiment.id for key, experiment in new_experiments.items()})
+        db.commit()
+
+
+def _copy_rows(cursor, table: str, fields, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(["" if value is None else value for value in row])
+    buffer.seek(0)
+    columns = ", ".join(f'"{column}"' for column in ("seq", "experiment_id", "epoch", *fields, "timestamp"))
+    cursor.copy_expert(f"COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+
+def _merge_staging(cursor, target: str, staging: str, fields):
+    columns = ", ".join(f'"{column}"' for column in ("experiment_id", "epoch", *fields, "timestamp"))
+    values = ", ".join(f'"{column}"' for column in ("experiment_id", "epoch", *fields))
+    updates = ", ".join(f'"{column}" = EXCLUDED."{column}"' for column in (*fields, "timestamp"))
+    # Same semantics as the ingest upserts: the last row for an epoch wins and overwrites existing data
+    cursor.execute(f"""
+        INSERT INTO {target} ({columns})
+        SELECT DISTINCT ON (experiment_id, epoch) {values}, COALESCE("timestamp", now())
+        FROM {staging}
+        ORDER BY experiment_id, epoch, seq DESC
+        ON CONFLICT (experiment_id, epoch) DO UPDATE SET {updates}
+    """)
+
+
+def _load_chunk(db, resolver: _Resolver, checkpoint: ImportCheckpoint, chunk, first_seq: int):
+    """COPY one chunk into the staging tables and merge it, committing the new checkpoint with it.
+
+    `chunk` holds parsed rows, with None for rejected ones; they still count towards the
+    checkpoint so a resumed import doesn't read them again.
+    """
+    resolver.resolve([row for row in chunk if row is not None])
+    # Share-lock the chunk's experiments like the ingest routes do (archive.lock_for_ingest), so an
+    # experiment can't be archived while its rows are being merged
+    experiment_ids = {resolver.experiments[(row["project"], row["experiment"])] for row in chunk if row is not None}
+    for experiment_id, archived_at in db.query(Experiment.id, Experiment.archived_at).filter(
+        Experiment.id.in_(experiment_ids)
+    ).with_for_update(read=True):
+        if archived_at:
+            resolver.archived.add(experiment_id)
+    series = {"metrics": [], "resource_usage": []}
+    touched = set()
+    for seq, row in enumerate(chunk, first_seq):
+        if row is None:
+            continue
+        experiment_id = resolver.experiments[(row["project"], row["experiment"])]
+        if experiment_id in resolver.archived:
+            continue
+        touched.add(experiment_id)
+        for kind in series:
+            if any(value is not None for value in row[kind]):
+                series[kind].append((seq, experiment_id, row["epoch"], *row[kind], row["timestamp"]))
+
+    cursor = db.connection().connection.cursor()
+    try:
+        for kind, (staging, fields) in _STAGING_TABLES.items():
+            if not series[kind]:
+                continue
+            columns = ", ".join(f'"{field}" double precision' for field in fields)
+            cursor.execute(f"""
+                CREATE TEMP TABLE IF NOT EXISTS {staging} (
+                    seq bigint, experiment_id integer, epoch integer, {columns}, "timestamp" timestamp
+                ) ON COMMIT DELETE ROWS
+            """)
+            _copy_rows(cursor, staging, fields, series[kind])
+            _merge_staging(cursor, kind, staging, fields)
+    finally:
+        cursor.close()
+
+    if series["resource_usage"]:
+        # Drop stale rollups in the same transaction; they are rebuilt at the end of the import, and
+        # lazily by get_summaries / lock_summary if the import dies before that
+        touched_resources = {row[1] for row in series["resource_usage"]}
+        db.query(ResourceUsageSummary).filter(
+            ResourceUsageSummary.experiment_id.in_(touched_resources)
+        ).delete(synchronize_session=False)
+
+    checkpoint.rows_done += len(chunk)
+    db.commit()
+    return touched, len(series["metrics"]), len(series["resource_usage"])
+
+
+def _init_worker():
+    # Connections inherited from the parent process must not be reused in the child
+    engine.dispose(close=False)
+
+
+def import_file(path: str, user_id: int, chunk_rows: int, restart: bool) -> dict:
+    """Import one file, resuming from its checkpoint. Runs in a worker process."""
+    source = os.path.abspath(path)
+    result = {"source": source, "rows": 0, "metrics": 0, "resource_usage": 0, "rejected": 0,
+              "experiment_ids": set(), "status": "imported"}
+    db = SessionLocal()
+    try:
+        fingerprint = _fingerprint(source)
+        checkpoint = db.get(ImportCheckpoint, source)
+        if checkpoint and (restart or checkpoint.fingerprint != fingerprint):
+            if not restart:
+                raise RuntimeError(f"{source} changed since it was last imported; rerun with --restart")
+            checkpoint.fingerprint, checkpoint.rows_done, checkpoint.finished_at = fingerprint, 0, None
+        elif checkpoint and checkpoint.finished_at:
+            result["status"] = "already imported"
+            return result
+        elif not checkpoint:
+            checkpoint = ImportCheckpoint(source=source, fingerprint=fingerprint, rows_done=0)
+            db.add(checkpoint)
+        db.commit()
+
+        skip = checkpoint.rows_done
+        if skip:
+            logger.info("%s: resuming after %d rows", source, skip)
+        resolver = _Resolver(db, user_id)
+        started = time.monotonic()
+        for first_seq, chunk, rejected in _chunks(source, skip, chunk_rows):
+            for row_number, reason in rejected:
+                result["rejected"] += 1
+                if result["rejected"] <= 10:
+                    logger.warning("%s: skipping row %d: %s", source, row_number, reason)
+            touched, metrics, resource_usage = _load_chunk(db, resolver, checkpoint, chunk, first_seq)
+            result["rows"] += len(chunk)
+            result["metrics"] += metrics
+            result["resource_usage"] += resource_usage
+            result["experiment_ids"] |= touched
+            logger.info("%s: %d rows loaded (%.0f rows/s)", source, skip + result["rows"],
+                        result["rows"] / max(time.monotonic() - started, 1e-9))
+
+        checkpoint.finished_at = datetime.utcnow()
+        db.commit()
+        return result
+    finally:
+        db.close()
+
+
+def rebuild_summaries(experiment_ids):
+    """Recompute resource usage rollups for the experiments touched by the import."""
+    db = SessionLocal()
+    try:
+        for done, experiment_id in enumerate(sorted(experiment_ids), 1):
+            rebuild_resource_summary(db, experiment_id)
+            if done % SUMMARY_COMMIT_EVERY == 0:
+                db.commit()
+                logger.info("Rebuilt %d/%d resource usage summaries", done, len(experiment_ids))
+        db.commit()
+    finally:
+        db.close()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Bulk import historical runs from CSV / JSON-lines files.")
+    parser.add_argument("files", nargs="+", help=".csv, .jsonl or .ndjson files, optionally gzipped")
+    parser.add_argument("--user", required=True, help="username that will own the imported projects")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="files imported in parallel")
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS, help="source rows per transaction")
+    parser.add_argument("--restart", action="store_true", help="ignore checkpoints and import every file again")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(processName)s %(message)s")
+
+    if engine.dialect.name != "postgresql":
+        parser.error("bulk import uses COPY and requires PostgreSQL")
+    db = SessionLocal()
+    try:
+        user_id = db.query(User.id).filter(User.username == args.user).scalar()
+    finally:
+        db.close()
+    if user_id is None:
+        parser.error(f"unknown user {args.user!r}")
+
+    failed = 0
+    touched = set()
+    totals = {"rows": 0, "metrics": 0, "resource_usage": 0, "rejected": 0}
+    with ProcessPoolExecutor(max_workers=max(1, args.workers), initializer=_init_worker) as pool:
+        futures = {pool.submit(import_file, path, user_id, args.chunk_rows, args.restart): path
+                   for path in args.files}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception:
+                failed += 1
+                logger.exception("%s: import failed, rerun to resume", futures[future])
+                continue
+            touched |= result["experiment_ids"]
+            for key in totals:
+                totals[key] += result[key]
+            logger.info("%s: %s (%d rows, %d metrics, %d resource usage, %d rejected)", result["source"],
+                        result["status"], result["rows"], result["metrics"], result["resource_usage"],
+                        result["rejected"])
+
+    if touched:
+        rebuild_summaries(touched)
+    logger.info("Done: %d rows, %d metrics, %d resource usage points, %d rejected, %d experiments, %d files failed",
+                totals["rows"], totals["metrics"], totals["resource_usage"], totals["rejected"], len(touched), failed)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
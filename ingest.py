@@ -0,0 +1,100 @@
+import random
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from models import Metric, ResourceUsage, IdempotencyKey
+from rollups import lock_summary, fold_samples, rebuild_resource_summary
+
+IDEMPOTENCY_KEY_TTL = timedelta(hours=24)
+# Expired keys are purged opportunistically on roughly one claim in this many
+IDEMPOTENCY_PURGE_EVERY = 1000
+
+
+def _insert(db: Session):
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"Upserts are not supported on {dialect}")
+    return insert
+
+
+def _dedupe_by_epoch(points):
+    # A single INSERT ... ON CONFLICT may not touch the same row twice; the last point for an epoch wins
+    return list({point["epoch"]: point for point in points}.values())
+
+
+def _upsert(db: Session, model, experiment_id: int, points):
+    insert = _insert(db)
+    rows = [dict(point, experiment_id=experiment_id) for point in points]
+    stmt = insert(model).values(rows)
+    update = {column: stmt.excluded[column] for column in rows[0] if column not in ("experiment_id", "epoch")}
+    update["timestamp"] = func.now()
+    db.execute(stmt.on_conflict_do_update(index_elements=["experiment_id", "epoch"], set_=update))
+
+
+def upsert_metrics(db: Session, experiment_id: int, points):
+    """Insert metric points, overwriting any existing point for the same (experiment_id, epoch)."""
+    points = _dedupe_by_epoch(points)
+    if points:
+        _upsert(db, Metric, experiment_id, points)
+    return len(points)
+
+
+def upsert_resource_usage(db: Session, experiment_id: int, points):
+    """Upsert resource usage points and keep the experiment's rollup consistent.
+
+    The summary row is locked first, which serializes writers for the experiment. New epochs
+    are folded in incrementally; if any epoch already existed the summary is rebuilt from the
+    rows instead, so retried points are never counted twice.
+    """
+    points = _dedupe_by_epoch(points)
+    if not points:
+        return 0
+    epochs = [point["epoch"] for point in points]
+
+    summary, _ = lock_summary(db, experiment_id)
+    replaced = db.query(ResourceUsage.epoch).filter(
+        ResourceUsage.experiment_id == experiment_id,
+        ResourceUsage.epoch.in_(epochs)
+    ).first()
+
+    _upsert(db, ResourceUsage, experiment_id, points)
+    if replaced:
+        rebuild_resource_summary(db, experiment_id)
+    else:
+        fold_samples(summary, points)
+    return len(points)
+
+
+def claim_idempotency_key(db: Session, user_id: int, key: str, route: str):
+    """Reserve a client-supplied idempotency key inside the current transaction.
+
+    Returns None if the request should be processed, or the stored response of the request
+    that already used this key. A concurrent duplicate blocks on the unique key until the
+    first request commits or rolls back.
+    """
+    if random.randrange(IDEMPOTENCY_PURGE_EVERY) == 0:
+        db.query(IdempotencyKey).filter(
+            IdempotencyKey.created_at < datetime.utcnow() - IDEMPOTENCY_KEY_TTL
+        ).delete(synchronize_session=False)
+
+    insert = _insert(db)
+    result = db.execute(
+        insert(IdempotencyKey)
+        .values(key=key, user_id=user_id, route=route)
+        .on_conflict_do_nothing(index_elements=["key", "user_id"])
+    )
+    if result.rowcount:
+        return None
+    stored = db.query(IdempotencyKey).filter_by(key=key, user_id=user_id).first()
+    return stored.response if stored and stored.response is not None else {"status": "duplicate request"}
+
+
+def complete_idempotency_key(db: Session, user_id: int, key: str, response: dict):
+    db.query(IdempotencyKey).filter_by(key=key, user_id=user_id).update({"response": response})
+    return response
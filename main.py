@@ -1,14 +1,25 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from database import Base, engine
-from routers import auth_router, experiments_router, upload_router, profile_router, projects_router
+from auth import start_hash_pool, stop_hash_pool
+from compression import CompressionMiddleware
+from profiler import ProfilerMiddleware
+from routers import auth_router, experiments_router, upload_router, profile_router, projects_router, admin_router, search_router
 
 
 # Initialize tables
 Base.metadata.create_all(bind=engine)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await start_hash_pool()
+    yield
+    stop_hash_pool()
+
+
 # FastAPI app setup
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -18,6 +29,8 @@ app.add_middleware(
     allow_headers=["*"],
     expose_headers=["Content-Disposition"],
 )
+app.add_middleware(CompressionMiddleware, minimum_size=1024)
+app.add_middleware(ProfilerMiddleware)
 
 # Register routers
 app.include_router(auth_router.router)
@@ -25,4 +38,6 @@ app.include_router(experiments_router.router)
 app.include_router(upload_router.router)
 app.include_router(profile_router.router)
 app.include_router(projects_router.router)
+app.include_router(admin_router.router)
+app.include_router(search_router.router)
 
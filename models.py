@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Text
+from sqlalchemy import Column, Integer, BigInteger, String, Float, Boolean, ForeignKey, DateTime, Text, JSON, UniqueConstraint, LargeBinary, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from database import Base
@@ -11,9 +11,12 @@ class User(Base):
     email = Column(String, unique=True, index=True)
     hashed_password = Column(String)
     api_key = Column(String, unique=True, index=True)
+    is_admin = Column(Boolean, default=False)
     experiments = relationship("Experiment", back_populates="owner")
     projects = relationship("Project", back_populates="owner")
 
+# name and description of projects and experiments also have PostgreSQL-only trigram and
+# full-text GIN indexes, created by migration rather than create_all (see search.py)
 class Project(Base):
     __tablename__ = "projects"
     id = Column(Integer, primary_key=True, index=True)
@@ -28,6 +31,8 @@ class Project(Base):
 
 class Experiment(Base):
     __tablename__ = "experiments"
+    # Serves the per-project listing and its keyset pagination on id
+    __table_args__ = (Index("ix_experiments_user_project_id", "user_id", "project_id", "id"),)
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
     description = Column(Text)
@@ -36,12 +41,21 @@ class Experiment(Base):
 
     owner = relationship("User", back_populates="experiments")
     metrics = relationship("Metric", back_populates="experiment", cascade="all, delete")
-    model = relationship("ModelFile", back_populates="experiment", uselist=False, cascade="all, delete")
+    checkpoints = relationship("ModelFile", back_populates="experiment", order_by="ModelFile.version",
+                               cascade="all, delete")
     project_id = Column(Integer, ForeignKey("projects.id"))
     project = relationship("Project", back_populates="experiments")
+    resource_summary = relationship("ResourceUsageSummary", back_populates="experiment", uselist=False,
+                                    cascade="all, delete")
+    # Set once the per-epoch rows have been packed into an ExperimentArchive (see archive.py)
+    archived_at = Column(DateTime, nullable=True)
+    archive = relationship("ExperimentArchive", back_populates="experiment", uselist=False, cascade="all, delete")
+    params = relationship("ExperimentParam", back_populates="experiment", cascade="all, delete")
+    tags = relationship("ExperimentTag", back_populates="experiment", cascade="all, delete")
 
 class Metric(Base):
     __tablename__ = "metrics"
+    __table_args__ = (UniqueConstraint("experiment_id", "epoch", name="uq_metrics_experiment_epoch"),)
     id = Column(Integer, primary_key=True, index=True)
     experiment_id = Column(Integer, ForeignKey("experiments.id"))
     epoch = Column(Integer)
@@ -56,14 +70,22 @@ class Metric(Base):
 
 class ModelFile(Base):
     __tablename__ = "model_files"
+    __table_args__ = (UniqueConstraint("experiment_id", "version", name="uq_model_files_experiment_version"),)
     id = Column(Integer, primary_key=True, index=True)
     experiment_id = Column(Integer, ForeignKey("experiments.id"))
     file_path = Column(String)
     uploaded_at = Column(DateTime, default=datetime.utcnow)
-    experiment = relationship("Experiment", back_populates="model")
+    # Checkpoints are numbered 1, 2, ... per experiment in upload order
+    version = Column(Integer)
+    epoch = Column(Integer, nullable=True)
+    is_best = Column(Boolean, default=False)
+    size_bytes = Column(BigInteger)
+    details = Column(JSON)
+    experiment = relationship("Experiment", back_populates="checkpoints")
 
 class ResourceUsage(Base):
     __tablename__ = "resource_usage"
+    __table_args__ = (UniqueConstraint("experiment_id", "epoch", name="uq_resource_usage_experiment_epoch"),)
     id = Column(Integer, primary_key=True, index=True)
     experiment_id = Column(Integer, ForeignKey("experiments.id"))
     epoch = Column(Integer, index=True)
@@ -77,3 +99,75 @@ class ResourceUsage(Base):
     timestamp = Column(DateTime, default=func.now())
 
     experiment = relationship("Experiment", backref="resource_usages")
+
+# Rolling aggregates of an experiment's resource_usage rows, maintained on ingest by rollups.py
+class ResourceUsageSummary(Base):
+    __tablename__ = "resource_usage_summaries"
+    experiment_id = Column(Integer, ForeignKey("experiments.id"), primary_key=True)
+    sample_count = Column(Integer, default=0)
+    total_training_time_sec = Column(Float, default=0)
+    peak_memory_mb = Column(Float)
+    peak_gpu_memory_mb = Column(Float)
+    # {field: {"count", "sum", "min", "max", "hist": {bucket: count}}}
+    stats = Column(JSON, default=dict)
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+    experiment = relationship("Experiment", back_populates="resource_summary")
+
+# Compressed columnar copy of an archived experiment's metrics and resource_usage rows
+class ExperimentArchive(Base):
+    __tablename__ = "experiment_archives"
+    experiment_id = Column(Integer, ForeignKey("experiments.id"), primary_key=True)
+    codec = Column(String)
+    metrics_blob = Column(LargeBinary)
+    resource_usage_blob = Column(LargeBinary)
+    metric_count = Column(Integer)
+    resource_usage_count = Column(Integer)
+    archived_at = Column(DateTime, default=func.now())
+
+    experiment = relationship("Experiment", back_populates="archive")
+
+# Client-supplied Idempotency-Key values and the response that was returned for them
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+    key = Column(String, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    route = Column(String)
+    response = Column(JSON)
+    created_at = Column(DateTime, default=func.now(), index=True)
+
+# One row per hyperparameter; numeric (and boolean) values are also kept in value_num so range
+# filters such as lr<0.01 can use the (key, value_num) index (see hyperparams.py)
+class ExperimentParam(Base):
+    __tablename__ = "experiment_params"
+    __table_args__ = (
+        Index("ix_experiment_params_key_num", "key", "value_num"),
+        Index("ix_experiment_params_key_text", "key", "value_text"),
+    )
+    experiment_id = Column(Integer, ForeignKey("experiments.id"), primary_key=True)
+    key = Column(String, primary_key=True)
+    value_text = Column(String)
+    value_num = Column(Float, nullable=True)
+    # value_text holds JSON (list, dict or null) rather than a plain string
+    value_json = Column(Boolean, default=False)
+
+    experiment = relationship("Experiment", back_populates="params")
+
+class ExperimentTag(Base):
+    __tablename__ = "experiment_tags"
+    __table_args__ = (Index("ix_experiment_tags_tag", "tag"),)
+    experiment_id = Column(Integer, ForeignKey("experiments.id"), primary_key=True)
+    tag = Column(String, primary_key=True)
+
+    experiment = relationship("Experiment", back_populates="tags")
+
+# Progress of an offline bulk import per source file, committed with each loaded chunk (see import_runs.py)
+class ImportCheckpoint(Base):
+    __tablename__ = "import_checkpoints"
+    source = Column(String, primary_key=True)
+    # size:mtime of the file when the import started; a changed file is not resumed
+    fingerprint = Column(String)
+    rows_done = Column(BigInteger, default=0)
+    started_at = Column(DateTime, default=func.now())
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+    finished_at = Column(DateTime, nullable=True)
@@ -0,0 +1,262 @@
+import contextvars
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+
+from jose import JWTError
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+
+from auth import decode_access_token
+from database import SessionLocal
+from models import User
+
+# Admins can profile a single request by sending this header with a non-empty value
+PROFILE_HEADER = "x-profile"
+# Fraction of all requests profiled without the header (0 disables sampling)
+PROFILE_SAMPLE_RATE = 0.0
+SAMPLE_INTERVAL_SECONDS = 0.005
+MAX_STACK_DEPTH = 64
+MAX_STORED_PROFILES = 50
+
+_active_profile = contextvars.ContextVar("active_profile", default=None)
+_ids = itertools.count(1)
+_store = OrderedDict()
+_store_lock = threading.Lock()
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{getattr(code, 'co_qualname', code.co_name)} ({os.path.basename(code.co_filename)})"
+
+
+# Code of this application, as opposed to the framework and threadpool frames below it on a stack
+_APP_DIR = os.path.dirname(os.path.abspath(__file__)) + os.sep
+
+
+def _unit_root(frame):
+    """Outermost application frame on the stack: the dependency or handler the thread is running."""
+    root = None
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(_APP_DIR) and "site-packages" not in filename:
+            root = frame
+        frame = frame.f_back
+    return root
+
+
+class Profile:
+    """Samples the stacks of the threads serving one request.
+
+    Sync handlers and dependencies run on shared threadpool workers, so a thread is attached to
+    the profile when it runs SQL or enters a stage() block on the request's behalf, together with
+    the frame of the unit of work it is running. Once that frame is gone from the thread's stack
+    the worker has moved on (possibly to another request) and is detached. Time spent in async
+    code on the event loop thread is not sampled.
+    """
+
+    def __init__(self, method: str, path: str, reason: str):
+        self.id = next(_ids)
+        self.method = method
+        self.path = path
+        self.reason = reason
+        self.started_at = datetime.utcnow()
+        self.duration_ms = None
+        self.status_code = None
+        self.samples = Counter()
+        self.stages = []
+        self.sql_statements = 0
+        self.sql_time_ms = 0.0
+        # thread ident -> root frame of the unit of work being done for this request
+        self.threads = {}
+        self._threads_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, name=f"profiler-{self.id}", daemon=True)
+
+    def attach_current_thread(self):
+        root = _unit_root(sys._getframe(1))
+        if root is None:
+            return
+        with self._threads_lock:
+            self.threads[threading.get_ident()] = root
+
+    def _detach(self, thread_id, root):
+        with self._threads_lock:
+            if self.threads.get(thread_id) is root:
+                del self.threads[thread_id]
+
+    def start(self):
+        self._t0 = time.perf_counter()
+        self._sampler.start()
+
+    def stop(self):
+        self._stop.set()
+        self._sampler.join()
+        self.duration_ms = round((time.perf_counter() - self._t0) * 1000, 2)
+        with self._threads_lock:
+            self.threads.clear()  # don't keep the request's frames alive
+
+    def _sample(self):
+        while not self._stop.wait(SAMPLE_INTERVAL_SECONDS):
+            frames = sys._current_frames()
+            with self._threads_lock:
+                attached = list(self.threads.items())
+            for thread_id, root in attached:
+                frame = frames.get(thread_id)
+                stack = []
+                serving = False
+                while frame is not None:
+                    serving = serving or frame is root
+                    if len(stack) < MAX_STACK_DEPTH:
+                        stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                if not serving:
+                    self._detach(thread_id, root)
+                elif stack:
+                    self.samples[";".join(reversed(stack))] += 1
+            del frames
+
+    def folded(self) -> str:
+        """Samples in the folded-stack format understood by flamegraph.pl and speedscope."""
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common())
+
+    def call_tree(self) -> dict:
+        root = {"name": "root", "samples": 0, "children": {}}
+        for stack, count in self.samples.items():
+            node = root
+            node["samples"] += count
+            for label in stack.split(";"):
+                node = node["children"].setdefault(label, {"name": label, "samples": 0, "children": {}})
+                node["samples"] += count
+
+        def finish(node):
+            children = sorted(node["children"].values(), key=lambda n: -n["samples"])
+            return {"name": node["name"], "samples": node["samples"], "children": [finish(c) for c in children]}
+
+        return finish(root)
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "reason": self.reason,
+            "status_code": self.status_code,
+            "started_at": self.started_at,
+            "duration_ms": self.duration_ms,
+            "sample_interval_ms": SAMPLE_INTERVAL_SECONDS * 1000,
+            "samples": sum(self.samples.values()),
+            "sql_statements": self.sql_statements,
+            "sql_time_ms": round(self.sql_time_ms, 2),
+            "stages": [{"name": name, "duration_ms": duration} for name, duration in self.stages],
+        }
+
+
+@contextmanager
+def stage(name: str):
+    """Time a named step of a request (e.g. the report pipeline) when it is being profiled."""
+    profile = _active_profile.get()
+    if profile is None:
+        yield
+        return
+    profile.attach_current_thread()
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.stages.append((name, round((time.perf_counter() - t0) * 1000, 2)))
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _active_profile.get()
+    if profile is not None:
+        profile.attach_current_thread()
+        conn.info.setdefault("profile_query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _active_profile.get()
+    if profile is not None and conn.info.get("profile_query_start"):
+        profile.sql_statements += 1
+        profile.sql_time_ms += (time.perf_counter() - conn.info["profile_query_start"].pop()) * 1000
+
+
+def _save(profile: Profile):
+    with _store_lock:
+        _store[profile.id] = profile
+        while len(_store) > MAX_STORED_PROFILES:
+            _store.popitem(last=False)
+
+
+def list_profiles() -> list:
+    with _store_lock:
+        return [p.summary() for p in reversed(_store.values())]
+
+
+def get_profile(profile_id: int):
+    with _store_lock:
+        return _store.get(profile_id)
+
+
+def _is_admin_token(authorization: str) -> bool:
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return False
+    try:
+        user_id = int(decode_access_token(token).get("sub"))
+    except (JWTError, TypeError, ValueError):
+        return False
+    db = SessionLocal()
+    try:
+        return bool(db.query(User.is_admin).filter(User.id == user_id).scalar())
+    finally:
+        db.close()
+
+
+class ProfilerMiddleware:
+    """Runs the sampling profiler around requests that ask for it (admins only) or are sampled."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        reason = None
+        if headers.get(PROFILE_HEADER) and await run_in_threadpool(_is_admin_token, headers.get("authorization", "")):
+            reason = "header"
+        elif PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE:
+            reason = "sampled"
+        if reason is None:
+            await self.app(scope, receive, send)
+            return
+
+        profile = Profile(scope["method"], scope["path"], reason)
+        token = _active_profile.set(profile)
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                profile.status_code = message["status"]
+                MutableHeaders(scope=message)["X-Profile-Id"] = str(profile.id)
+            await send(message)
+
+        profile.start()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            profile.stop()
+            _active_profile.reset(token)
+            _save(profile)
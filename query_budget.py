@@ -0,0 +1,54 @@
+import contextvars
+import logging
+
+from fastapi import Request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# When True a route that goes over its budget fails loudly instead of only logging a warning.
+# Turn this on in development and CI to catch N+1 regressions before they ship.
+QUERY_BUDGET_STRICT = False
+
+
+class QueryBudgetExceeded(RuntimeError):
+    pass
+
+
+class _StatementCounter:
+    __slots__ = ("count",)
+
+    def __init__(self):
+        self.count = 0
+
+
+_current_counter = contextvars.ContextVar("query_budget_counter", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    counter = _current_counter.get()
+    if counter is not None:
+        counter.count += 1
+
+
+def query_budget(max_statements: int):
+    """Route dependency asserting that a request issues at most `max_statements` SQL statements.
+
+    Must be listed in the route's `dependencies=[...]` so it is resolved before any dependency
+    that touches the database (such as get_current_user). The counter object is shared with the
+    threadpool workers that run sync dependencies and handlers, which get a copy of this context.
+    """
+    async def dependency(request: Request):
+        counter = _StatementCounter()
+        _current_counter.set(counter)
+        yield counter
+        if counter.count > max_statements:
+            route = getattr(request.scope.get("route"), "path", request.url.path)
+            message = f"{request.method} {route} issued {counter.count} SQL statements (budget {max_statements})"
+            if QUERY_BUDGET_STRICT:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+
+    return dependency
@@ -0,0 +1,250 @@
+import math
+import threading
+import time
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+
+from fastapi import Header, HTTPException, Request
+from starlette.concurrency import run_in_threadpool
+
+from database import SessionLocal
+from models import User
+
+# Set to a redis:// URL to share buckets and concurrency slots between workers
+RATE_LIMIT_BACKEND_URL = None
+MAX_TRACKED_KEYS = 10000
+# Seconds a valid API key is trusted before asking the database again
+API_KEY_CACHE_TTL = 300
+MAX_CONCURRENT_KEY_LOOKUPS = 4
+# Bucket shared by every request whose API key is missing or does not belong to a user
+UNKNOWN_KEY = "unknown"
+
+
+@dataclass(frozen=True)
+class RouteLimit:
+    rate: float         # tokens refilled per second
+    burst: int          # bucket capacity
+    concurrency: int    # in-flight requests per API key
+    route_concurrency: int  # in-flight requests per route across all keys
+
+
+DEFAULT_LIMIT = RouteLimit(rate=5, burst=10, concurrency=2, route_concurrency=8)
+
+ROUTE_LIMITS = {
+    "/metrics": RouteLimit(rate=20, burst=40, concurrency=4, route_concurrency=10),
+    "/resource-usage": RouteLimit(rate=20, burst=40, concurrency=4, route_concurrency=10),
+    "/metrics/batch": RouteLimit(rate=2, burst=10, concurrency=2, route_concurrency=6),
+    "/resource-usage/batch": RouteLimit(rate=2, burst=10, concurrency=2, route_concurrency=6),
+    "/upload_model": RouteLimit(rate=0.2, burst=2, concurrency=1, route_concurrency=4),
+    "/projects": RouteLimit(rate=1, burst=5, concurrency=1, route_concurrency=4),
+    "/experiments": RouteLimit(rate=1, burst=10, concurrency=2, route_concurrency=4),
+}
+
+# (route, reason) -> number of requests rejected with 429
+throttle_counters = Counter()
+_counter_lock = threading.Lock()
+
+
+class InMemoryBackend:
+    def __init__(self, max_keys=MAX_TRACKED_KEYS):
+        self.max_keys = max_keys
+        self.buckets = OrderedDict()
+        self.in_flight = Counter()
+        self.lock = threading.Lock()
+
+    def take(self, key, rate, burst):
+        """Consume one token; return 0 if allowed, else seconds until a token is available."""
+        now = time.monotonic()
+        with self.lock:
+            tokens, updated = self.buckets.pop(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            if tokens >= 1:
+                tokens -= 1
+                retry_after = 0
+            else:
+                retry_after = (1 - tokens) / rate
+            self.buckets[key] = (tokens, now)
+            # Evict least recently seen keys so junk API keys can't grow the table forever
+            while len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+        return retry_after
+
+    def acquire(self, key, limit):
+        with self.lock:
+            if self.in_flight[key] >= limit:
+                return False
+            self.in_flight[key] += 1
+            return True
+
+    def release(self, key):
+        with self.lock:
+            self.in_flight[key] -= 1
+            if self.in_flight[key] <= 0:
+                del self.in_flight[key]
+
+
+class RedisBackend:
+    # Token bucket evaluated atomically on the server, using the server clock
+    TAKE_SCRIPT = """
+    local t = redis.call('TIME')
+    local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+    local rate = tonumber(ARGV[1])
+    local burst = tonumber(ARGV[2])
+    local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+    local tokens = tonumber(state[1]) or burst
+    local updated = tonumber(state[2]) or now
+    tokens = math.min(burst, tokens + (now - updated) * rate)
+    local retry_after = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+    else
+        retry_after = (1 - tokens) / rate
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+    return tostring(retry_after)
+    """
+    ACQUIRE_SCRIPT = """
+    local n = redis.call('INCR', KEYS[1])
+    redis.call('EXPIRE', KEYS[1], 300)
+    if n > tonumber(ARGV[1]) then
+        redis.call('DECR', KEYS[1])
+        return 0
+    end
+    return 1
+    """
+
+    def __init__(self, url):
+        import redis  # only needed when a shared backend is configured
+
+        self.client = redis.Redis.from_url(url)
+        self._take = self.client.register_script(self.TAKE_SCRIPT)
+        self._acquire = self.client.register_script(self.ACQUIRE_SCRIPT)
+
+    def take(self, key, rate, burst):
+        return float(self._take(keys=[f"rl:bucket:{key}"], args=[rate, burst]))
+
+    def acquire(self, key, limit):
+        return bool(self._acquire(keys=[f"rl:inflight:{key}"], args=[limit]))
+
+    def release(self, key):
+        self.client.decr(f"rl:inflight:{key}")
+
+
+class ApiKeyCache:
+    """Remembers API keys recently found to belong to a user, so only real keys get a bucket of
+    their own. Unknown keys are never stored, so made-up keys can't push real ones out."""
+
+    def __init__(self, max_keys=MAX_TRACKED_KEYS, ttl=API_KEY_CACHE_TTL):
+        self.max_keys = max_keys
+        self.ttl = ttl
+        self.keys = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __contains__(self, api_key):
+        with self.lock:
+            expires = self.keys.get(api_key)
+            if expires is None or expires < time.monotonic():
+                return False
+            self.keys.move_to_end(api_key)
+            return True
+
+    def add(self, api_key):
+        with self.lock:
+            self.keys[api_key] = time.monotonic() + self.ttl
+            self.keys.move_to_end(api_key)
+            while len(self.keys) > self.max_keys:
+                self.keys.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.keys.clear()
+
+
+def _lookup_api_key(api_key: str) -> bool:
+    db = SessionLocal()
+    try:
+        return db.query(User.id).filter(User.api_key == api_key).first() is not None
+    finally:
+        db.close()
+
+
+async def _bucket_owner(api_key, route: str, limit: RouteLimit):
+    """The API key itself if it belongs to a user, else the shared UNKNOWN_KEY.
+
+    Keying buckets on the raw header would give every made-up key a full bucket of its own and
+    let a stream of them evict the buckets of real keys. A key that is not cached pays for its
+    lookup from the shared bucket first, so junk keys are throttled before they reach the
+    database, and at most MAX_CONCURRENT_KEY_LOOKUPS lookups hold a connection at once.
+    """
+    if not api_key:
+        return UNKNOWN_KEY
+    if api_key in api_keys:
+        return api_key
+
+    retry_after = backend.take(f"{UNKNOWN_KEY}:{route}", limit.rate, limit.burst)
+    if retry_after:
+        _throttle(route, "rate", retry_after)
+    if not _key_lookups.acquire(blocking=False):
+        _throttle(route, "key_lookup", 1)
+    try:
+        valid = await run_in_threadpool(_lookup_api_key, api_key)
+    finally:
+        _key_lookups.release()
+    if not valid:
+        return UNKNOWN_KEY
+    api_keys.add(api_key)
+    return api_key
+
+
+api_keys = ApiKeyCache()
+_key_lookups = threading.BoundedSemaphore(MAX_CONCURRENT_KEY_LOOKUPS)
+backend = RedisBackend(RATE_LIMIT_BACKEND_URL) if RATE_LIMIT_BACKEND_URL else InMemoryBackend()
+
+
+def _throttle(route: str, reason: str, retry_after: float):
+    with _counter_lock:
+        throttle_counters[(route, reason)] += 1
+    raise HTTPException(
+        status_code=429,
+        detail=f"Too many requests ({reason})",
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+async def admission_control(request: Request, x_api_key: str = Header(None)):
+    """Reject excess traffic per API key and route before the handler runs.
+
+    Requests with a missing or unknown API key all share one bucket per route; the only database
+    access is looking up an API key that is not cached yet, see _bucket_owner.
+    """
+    route = getattr(request.scope.get("route"), "path", request.url.path)
+    limit = ROUTE_LIMITS.get(route, DEFAULT_LIMIT)
+    owner = await _bucket_owner(x_api_key, route, limit)
+    key = f"{owner}:{route}"
+
+    # An unknown key already paid its token from the shared bucket before the lookup
+    if owner != UNKNOWN_KEY or not x_api_key:
+        retry_after = backend.take(key, limit.rate, limit.burst)
+        if retry_after:
+            _throttle(route, "rate", retry_after)
+
+    if not backend.acquire(key, limit.concurrency):
+        _throttle(route, "concurrency", 1)
+    if not backend.acquire(route, limit.route_concurrency):
+        backend.release(key)
+        _throttle(route, "route_concurrency", 1)
+
+    try:
+        yield
+    finally:
+        backend.release(route)
+        backend.release(key)
+
+
+def get_throttle_stats():
+    with _counter_lock:
+        return [
+            {"route": route, "reason": reason, "count": count}
+            for (route, reason), count in sorted(throttle_counters.items())
+        ]
@@ -0,0 +1,187 @@
+import math
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models import ResourceUsage, ResourceUsageSummary
+
+FIELDS = ("cpu_usage_percent", "memory_usage_mb", "gpu_usage_percent", "gpu_memory_usage_mb", "training_time_sec")
+
+# Log-spaced histogram buckets: percentiles are accurate to ~1% relative error and
+# histograms from different experiments can be merged for project-level summaries
+BUCKET_GROWTH = 1.02
+_LOG_GROWTH = math.log(BUCKET_GROWTH)
+ZERO_BUCKET = "z"
+
+
+def _bucket(value: float) -> str:
+    if value <= 0:
+        return ZERO_BUCKET
+    return str(math.floor(math.log(value) / _LOG_GROWTH))
+
+
+def _bucket_value(bucket: str) -> float:
+    if bucket == ZERO_BUCKET:
+        return 0.0
+    return BUCKET_GROWTH ** (int(bucket) + 0.5)
+
+
+def _empty_field():
+    return {"count": 0, "sum": 0.0, "min": None, "max": None, "hist": {}}
+
+
+def add_samples(stats: dict, samples) -> dict:
+    """Return a new stats dict with each sample (a mapping of FIELDS to values) folded in."""
+    stats = {field: dict(stats.get(field) or _empty_field(), hist=dict((stats.get(field) or {}).get("hist", {})))
+             for field in FIELDS}
+    for sample in samples:
+        for field in FIELDS:
+            value = sample.get(field)
+            if value is None:
+                continue
+            s = stats[field]
+            s["count"] += 1
+            s["sum"] += value
+            s["min"] = value if s["min"] is None else min(s["min"], value)
+            s["max"] = value if s["max"] is None else max(s["max"], value)
+            bucket = _bucket(value)
+            s["hist"][bucket] = s["hist"].get(bucket, 0) + 1
+    return stats
+
+
+def merge_stats(stats_list) -> dict:
+    merged = {field: _empty_field() for field in FIELDS}
+    for stats in stats_list:
+        for field in FIELDS:
+            s = (stats or {}).get(field)
+            if not s or not s["count"]:
+                continue
+            m = merged[field]
+            m["count"] += s["count"]
+            m["sum"] += s["sum"]
+            m["min"] = s["min"] if m["min"] is None else min(m["min"], s["min"])
+            m["max"] = s["max"] if m["max"] is None else max(m["max"], s["max"])
+            for bucket, count in s["hist"].items():
+                m["hist"][bucket] = m["hist"].get(bucket, 0) + count
+    return merged
+
+
+def _percentile(s: dict, pct: float):
+    if not s["count"]:
+        return None
+    rank = math.ceil(pct / 100 * s["count"])
+    seen = 0
+    for bucket in sorted(s["hist"], key=lambda b: -math.inf if b == ZERO_BUCKET else int(b)):
+        seen += s["hist"][bucket]
+        if seen >= rank:
+            # Clamp the bucket estimate to what was actually observed
+            return min(max(_bucket_value(bucket), s["min"]), s["max"])
+    return s["max"]
+
+
+def describe(stats: dict) -> dict:
+    """Turn raw stats into the min/max/mean/p95 shape returned by the summary endpoints."""
+    fields = {}
+    for field in FIELDS:
+        s = (stats or {}).get(field) or _empty_field()
+        fields[field] = {
+            "min": s["min"],
+            "max": s["max"],
+            "mean": round(s["sum"] / s["count"], 4) if s["count"] else None,
+            "p95": _percentile(s, 95),
+            "samples": s["count"],
+        }
+    training_time = (stats or {}).get("training_time_sec") or _empty_field()
+    return {
+        "total_training_time_sec": round(training_time["sum"], 4),
+        "peak_memory_mb": fields["memory_usage_mb"]["max"],
+        "peak_gpu_memory_mb": fields["gpu_memory_usage_mb"]["max"],
+        "metrics": fields,
+    }
+
+
+def _apply(summary: ResourceUsageSummary, stats: dict, sample_count: int):
+    summary.stats = stats
+    summary.sample_count = sample_count
+    summary.total_training_time_sec = stats["training_time_sec"]["sum"]
+    summary.peak_memory_mb = stats["memory_usage_mb"]["max"]
+    summary.peak_gpu_memory_mb = stats["gpu_memory_usage_mb"]["max"]
+
+
+def _row_samples(db: Session, experiment_id: int):
+    columns = [getattr(ResourceUsage, field) for field in FIELDS]
+    rows = db.query(*columns).filter(ResourceUsage.experiment_id == experiment_id).all()
+    return [dict(zip(FIELDS, row)) for row in rows]
+
+
+def lock_summary(db: Session, experiment_id: int):
+    """Fetch the summary row FOR UPDATE, building it from existing rows the first time.
+
+    Returns (summary, created). Holding the lock serializes writers for the experiment, so
+    call this before inserting the rows that are about to be folded in.
+    """
+    summary = db.query(ResourceUsageSummary).filter_by(experiment_id=experiment_id).with_for_update().first()
+    if summary:
+        return summary, False
+
+    samples = _row_samples(db, experiment_id)
+    summary = ResourceUsageSummary(experiment_id=experiment_id)
+    _apply(summary, add_samples({}, samples), len(samples))
+    try:
+        with db.begin_nested():
+            db.add(summary)
+    except IntegrityError:
+        # Another request created it concurrently; lock theirs instead
+        summary = db.query(ResourceUsageSummary).filter_by(experiment_id=experiment_id).with_for_update().one()
+        return summary, False
+    return summary, True
+
+
+def fold_samples(summary: ResourceUsageSummary, samples) -> ResourceUsageSummary:
+    """Fold samples for rows that don't exist yet into a summary obtained from lock_summary."""
+    samples = list(samples)
+    _apply(summary, add_samples(summary.stats or {}, samples), (summary.sample_count or 0) + len(samples))
+    return summary
+
+
+def rebuild_resource_summary(db: Session, experiment_id: int) -> ResourceUsageSummary:
+    """Recompute the summary from the experiment's rows, e.g. after rows were replaced or bulk loaded."""
+    summary, created = lock_summary(db, experiment_id)
+    if not created:
+        samples = _row_samples(db, experiment_id)
+        _apply(summary, add_samples({}, samples), len(samples))
+    return summary
+
+
+def get_summaries(db: Session, experiment_ids) -> list:
+    """Summaries for the given experiments, building any that predate the rollup table.
+
+    Missing summaries are built from a single query over their rows, so the number of
+    statements doesn't grow with the number of experiments.
+    """
+    experiment_ids = list(experiment_ids)
+    query = db.query(ResourceUsageSummary).filter(ResourceUsageSummary.experiment_id.in_(experiment_ids))
+    summaries = query.all()
+    missing = set(experiment_ids) - {s.experiment_id for s in summaries}
+    if not missing:
+        return summaries
+
+    samples_by_experiment = {experiment_id: [] for experiment_id in missing}
+    columns = [ResourceUsage.experiment_id] + [getattr(ResourceUsage, field) for field in FIELDS]
+    for row in db.query(*columns).filter(ResourceUsage.experiment_id.in_(missing)):
+        samples_by_experiment[row[0]].append(dict(zip(FIELDS, row[1:])))
+
+    built = []
+    for experiment_id, samples in samples_by_experiment.items():
+        summary = ResourceUsageSummary(experiment_id=experiment_id)
+        _apply(summary, add_samples({}, samples), len(samples))
+        built.append(summary)
+    try:
+        with db.begin_nested():
+            db.add_all(built)
+    except IntegrityError:
+        # Raced with an ingest that created some of them; fall back to one at a time
+        for experiment_id in missing:
+            lock_summary(db, experiment_id)
+    db.commit()
+    return query.all()
@@ -0,0 +1,28 @@
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import PlainTextResponse
+from auth import get_current_admin
+from models import User
+import profiler
+
+router = APIRouter(tags=["Admin"])
+
+
+@router.get("/admin/profiles")
+def list_request_profiles(admin: User = Depends(get_current_admin)):
+    return profiler.list_profiles()
+
+
+@router.get("/admin/profiles/{profile_id}")
+def get_request_profile(profile_id: int, admin: User = Depends(get_current_admin)):
+    profile = profiler.get_profile(profile_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return {**profile.summary(), "call_tree": profile.call_tree()}
+
+
+@router.get("/admin/profiles/{profile_id}/folded", response_class=PlainTextResponse)
+def get_request_profile_folded(profile_id: int, admin: User = Depends(get_current_admin)):
+    profile = profiler.get_profile(profile_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile.folded()
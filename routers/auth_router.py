@@ -1,32 +1,45 @@
 from fastapi import APIRouter, Depends, HTTPException, Form, Request
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 import uuid
 from database import get_db
 from models import User
-from auth import get_password_hash, verify_password, create_access_token, SECRET_KEY, ALGORITHM
+from auth import get_password_hash_async, verify_password_async, create_access_token, decode_access_token
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.security import HTTPBearer
-from jose import JWTError, jwt
+from jose import JWTError
 security = HTTPBearer()
 router = APIRouter(tags=["Auth"])
 
 
-@router.post("/register")
-def register_user(username: str = Form(...), email: str = Form(...), password: str = Form(...),
-                  db: Session = Depends(get_db)):
-    hashed_pw = get_password_hash(password)
-    api_key = str(uuid.uuid4())
-    user = User(username=username, email=email, hashed_password=hashed_pw, api_key=api_key)
+# These handlers are async so that waiting on the bcrypt process pool doesn't hold a threadpool
+# worker; their (short) DB work is pushed to the threadpool explicitly.
+
+def _create_user(db: Session, user: User):
     db.add(user)
     db.commit()
     db.refresh(user)
+    return user
+
+
+def _get_user_by_username(db: Session, username: str):
+    return db.query(User).filter(User.username == username).first()
+
+
+@router.post("/register")
+async def register_user(username: str = Form(...), email: str = Form(...), password: str = Form(...),
+                        db: Session = Depends(get_db)):
+    hashed_pw = await get_password_hash_async(password)
+    api_key = str(uuid.uuid4())
+    user = User(username=username, email=email, hashed_password=hashed_pw, api_key=api_key)
+    user = await run_in_threadpool(_create_user, db, user)
     return {"api_key": user.api_key, "user_id": user.id}
 
 
 @router.post("/token")
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.username == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+    user = await run_in_threadpool(_get_user_by_username, db, form_data.username)
+    if not user or not await verify_password_async(form_data.password, user.hashed_password):
         raise HTTPException(status_code=400, detail="Invalid credentials")
     access_token = create_access_token(data={"sub": str(user.id)})
     return {"access_token": access_token, "token_type": "bearer"}
@@ -34,7 +47,7 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
 @router.get("/validate-token")
 def validate_token(token: str = Depends(security)):
     try:
-        payload = jwt.decode(token.credentials, SECRET_KEY, algorithms=[ALGORITHM])
+        decode_access_token(token.credentials)
         return {"valid": True}
     except JWTError:
         raise HTTPException(status_code=401, detail="Token expired or invalid")
@@ -1,42 +1,105 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
+from typing import Optional
 from database import get_db
 from auth import get_current_user
-from models import Experiment, User, ModelFile
-from fastapi.responses import FileResponse
+from models import (Experiment, User, ModelFile, Metric, ResourceUsage, ResourceUsageSummary, ExperimentArchive,
+                    ExperimentParam, ExperimentTag)
+from fastapi.responses import FileResponse, StreamingResponse
+from bundles import stream_bundle, checkpoint_arcname, MEDIA_TYPES
+from rollups import get_summaries, describe
+from archive import archive_experiment, forget_archive, load_metrics, load_resource_usage
+from query_budget import query_budget
+from hyperparams import parse_filter, load_params_and_tags
 import os
 
 router = APIRouter(tags=["Dashboard"])
 
 
-@router.get("/projects/{project_id}/experiments")
-def get_user_experiments(project_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    experiments = db.query(Experiment).filter(
+@router.get("/projects/{project_id}/experiments", dependencies=[Depends(query_budget(4))])
+def get_user_experiments(
+    project_id: int,
+    response: Response,
+    filter_expr: Optional[str] = Query(None, alias="filter", description="e.g. lr<0.01 AND optimizer=adam AND tag=baseline"),
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    after_id: Optional[int] = Query(None, description="Value of X-Next-Cursor from the previous page"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    query = db.query(Experiment).filter(
         Experiment.user_id == current_user.id,
         Experiment.project_id == project_id
-    ).all()
-    return experiments
-
-@router.delete("/experiments/{experiment_id}")
+    )
+    if filter_expr:
+        try:
+            query = query.filter(parse_filter(filter_expr))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid filter: {e}")
+    # Keyset pagination on id: each page is an index range scan, however deep into the listing it is
+    if after_id is not None:
+        query = query.filter(Experiment.id > after_id)
+    query = query.order_by(Experiment.id)
+    if limit is not None:
+        experiments = query.limit(limit + 1).all()
+        if len(experiments) > limit:
+            experiments = experiments[:limit]
+            response.headers["X-Next-Cursor"] = str(experiments[-1].id)
+    else:
+        experiments = query.all()
+
+    params, tags = load_params_and_tags(db, [exp.id for exp in experiments])
+    return [
+        {
+            "id": exp.id,
+            "name": exp.name,
+            "description": exp.description,
+            "user_id": exp.user_id,
+            "project_id": exp.project_id,
+            "created_at": exp.created_at,
+            "archived_at": exp.archived_at,
+            "hyperparameters": params[exp.id],
+            "tags": tags[exp.id],
+        }
+        for exp in experiments
+    ]
+
+@router.delete("/experiments/{experiment_id}", dependencies=[Depends(query_budget(10))])
 def delete_experiment(experiment_id: int, current_user: User = Depends(get_current_user),
                       db: Session = Depends(get_db)):
-    experiment = db.query(Experiment).filter_by(id=experiment_id, user_id=current_user.id).first()
+    experiment = db.query(Experiment.id).filter_by(id=experiment_id, user_id=current_user.id).first()
     if not experiment:
         raise HTTPException(status_code=404, detail="Experiment not found")
-    db.delete(experiment)
+    # Bulk deletes instead of the ORM cascade, which loads and deletes every metric row one by one
+    for model in (Metric, ResourceUsage, ModelFile, ResourceUsageSummary, ExperimentArchive, ExperimentParam,
+                  ExperimentTag):
+        db.query(model).filter(model.experiment_id == experiment_id).delete(synchronize_session=False)
+    db.query(Experiment).filter(Experiment.id == experiment_id).delete(synchronize_session=False)
     db.commit()
+    forget_archive(experiment_id)
     return {"status": "experiment deleted"}
 
 
-@router.get("/experiments/{experiment_id}/metrics")
+@router.post("/experiments/{experiment_id}/archive", dependencies=[Depends(query_budget(14))])
+def archive_experiment_series(experiment_id: int, current_user: User = Depends(get_current_user),
+                              db: Session = Depends(get_db)):
+    experiment = db.query(Experiment).filter_by(id=experiment_id, user_id=current_user.id).first()
+    if not experiment:
+        raise HTTPException(status_code=404, detail="Experiment not found")
+    if not archive_experiment(db, experiment):
+        return {"status": "experiment already archived"}
+    db.commit()
+    return {"status": "experiment archived"}
+
+
+@router.get("/experiments/{experiment_id}/metrics", dependencies=[Depends(query_budget(4))])
 def get_experiment_metrics(experiment_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     experiment = db.query(Experiment).filter(Experiment.id == experiment_id, Experiment.user_id == current_user.id,).first()
     if not experiment:
         raise HTTPException(status_code=404, detail="Experiment not found in this project")
-    return experiment.metrics
+    return load_metrics(db, [experiment])[experiment.id]
 
 
-@router.get("/experiments/{experiment_id}/metrics/last")
+@router.get("/experiments/{experiment_id}/metrics/last", dependencies=[Depends(query_budget(4))])
 def get_last_epoch_metrics(
     experiment_id: int,
     current_user: User = Depends(get_current_user),
@@ -50,11 +113,12 @@ def get_last_epoch_metrics(
     if not experiment:
         raise HTTPException(status_code=404, detail="Experiment not found in this project")
 
-    if not experiment.metrics or len(experiment.metrics) == 0:
+    metrics = load_metrics(db, [experiment])[experiment.id]
+    if not metrics:
         raise HTTPException(status_code=404, detail="No metrics found for this experiment")
 
     # Ensure we get the metric for the last epoch
-    last_metric = max(experiment.metrics, key=lambda m: m.epoch)
+    last_metric = max(metrics, key=lambda m: m.epoch)
     return {
         "epoch": last_metric.epoch,
         "accuracy": last_metric.accuracy,
@@ -66,17 +130,50 @@ def get_last_epoch_metrics(
     }
 
 
-@router.get("/experiments/{experiment_id}/model")
+@router.get("/experiments/{experiment_id}/checkpoints", dependencies=[Depends(query_budget(3))])
+def list_checkpoints(
+    experiment_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    experiment = db.query(Experiment.id).filter_by(id=experiment_id, user_id=current_user.id).first()
+    if not experiment:
+        raise HTTPException(status_code=404, detail="Experiment not found")
+
+    checkpoints = db.query(ModelFile).filter_by(experiment_id=experiment_id).order_by(ModelFile.version).all()
+    return [
+        {
+            "version": c.version,
+            "epoch": c.epoch,
+            "is_best": c.is_best,
+            "size_bytes": c.size_bytes,
+            "metadata": c.details,
+            "filename": os.path.basename(c.file_path),
+            "uploaded_at": c.uploaded_at,
+        }
+        for c in checkpoints
+    ]
+
+
+@router.get("/experiments/{experiment_id}/model", dependencies=[Depends(query_budget(3))])
 def download_model_file(
     experiment_id: int,
+    version: Optional[int] = None,
+    best: bool = False,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    experiment = db.query(Experiment).filter_by(id=experiment_id, user_id=current_user.id).first()
+    experiment = db.query(Experiment.id).filter_by(id=experiment_id, user_id=current_user.id).first()
     if not experiment:
         raise HTTPException(status_code=404, detail="Experiment not found")
 
-    model_file = db.query(ModelFile).filter_by(experiment_id=experiment_id).first()
+    # Defaults to the latest checkpoint
+    query = db.query(ModelFile).filter_by(experiment_id=experiment_id)
+    if version is not None:
+        query = query.filter_by(version=version)
+    elif best:
+        query = query.filter_by(is_best=True)
+    model_file = query.order_by(ModelFile.version.desc()).first()
     if not model_file or not os.path.exists(model_file.file_path):
         raise HTTPException(status_code=404, detail="Model file not found")
 
@@ -86,7 +183,39 @@ def download_model_file(
         media_type='application/octet-stream'
     )
 
-@router.get("/experiments/{experiment_id}/resource-usage")
+
+@router.get("/experiments/{experiment_id}/checkpoints/bundle", dependencies=[Depends(query_budget(3))])
+def download_checkpoint_bundle(
+    experiment_id: int,
+    versions: Optional[str] = Query(None, description="Comma-separated versions; all checkpoints if omitted"),
+    fmt: str = Query("zip", alias="format", pattern="^(zip|tar)$"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    experiment = db.query(Experiment.id, Experiment.name).filter_by(id=experiment_id, user_id=current_user.id).first()
+    if not experiment:
+        raise HTTPException(status_code=404, detail="Experiment not found")
+
+    query = db.query(ModelFile.version, ModelFile.file_path).filter_by(experiment_id=experiment_id)
+    if versions:
+        try:
+            wanted = [int(v) for v in versions.split(",") if v.strip()]
+        except ValueError:
+            raise HTTPException(status_code=400, detail="versions must be a comma-separated list of integers")
+        query = query.filter(ModelFile.version.in_(wanted))
+    entries = [
+        (checkpoint_arcname(experiment.name, c.version, c.file_path), c.file_path)
+        for c in query.order_by(ModelFile.version) if os.path.exists(c.file_path)
+    ]
+    if not entries:
+        raise HTTPException(status_code=404, detail="No checkpoints found")
+
+    return StreamingResponse(stream_bundle(entries, fmt), media_type=MEDIA_TYPES[fmt], headers={
+        "Content-Disposition": f"attachment; filename=experiment_{experiment_id}_checkpoints.{fmt}"
+    })
+
+
+@router.get("/experiments/{experiment_id}/resource-usage", dependencies=[Depends(query_budget(4))])
 def get_resource_usage(
     experiment_id: int,
     current_user: User = Depends(get_current_user),
@@ -100,7 +229,25 @@ def get_resource_usage(
     if not experiment:
         raise HTTPException(status_code=404, detail="Experiment not found")
 
-    return experiment.resource_usages  # Assuming a relationship is defined
+    return load_resource_usage(db, [experiment])[experiment.id]
+
+
+@router.get("/experiments/{experiment_id}/resource-usage/summary", dependencies=[Depends(query_budget(8))])
+def get_resource_usage_summary(
+    experiment_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    experiment = db.query(Experiment.id).filter(
+        Experiment.id == experiment_id,
+        Experiment.user_id == current_user.id
+    ).first()
+
+    if not experiment:
+        raise HTTPException(status_code=404, detail="Experiment not found")
+
+    summary = get_summaries(db, [experiment_id])[0]
+    return {"experiment_id": experiment_id, **describe(summary.stats)}
 
 # username: affan
 # password: pass
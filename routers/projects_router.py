@@ -1,7 +1,13 @@
 from database import get_db
 from auth import get_current_user  # Assuming this returns a User
-from models import User, Project, Experiment
-from fastapi import APIRouter, Depends, HTTPException, Response
+from rollups import get_summaries, merge_stats, describe
+from archive import archive_experiment, load_metrics
+from query_budget import query_budget
+from profiler import stage
+from bundles import stream_bundle, checkpoint_arcname, MEDIA_TYPES
+from models import User, Project, Experiment, ModelFile
+from fastapi import APIRouter, Depends, HTTPException, Response, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from weasyprint import HTML
 from jinja2 import Template
@@ -14,9 +20,9 @@ from pathlib import Path
 matplotlib.use("Agg")
 router = APIRouter(tags=["Projects"])
 
-@router.get("/projects")
-def get_projects(current_user: User = Depends(get_current_user)):
-    return current_user.projects
+@router.get("/projects", dependencies=[Depends(query_budget(2))])
+def get_projects(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    return db.query(Project).filter(Project.user_id == current_user.id).all()
 
 
 def generate_chart(metric_name, values, names, output_dir="C:/tmp"):
@@ -40,12 +46,12 @@ def generate_chart(metric_name, values, names, output_dir="C:/tmp"):
     # ✅ This returns a properly formatted `file:///C:/...` URI
     return Path(file_path).as_uri()
 
-def generate_metric_line_chart(metric_name, experiments, output_dir="C:/tmp"):
+def generate_metric_line_chart(metric_name, experiments, metrics_by_experiment, output_dir="C:/tmp"):
     os.makedirs(output_dir, exist_ok=True)
     plt.figure(figsize=(8, 5))
 
     for exp in experiments:
-        sorted_metrics = sorted(exp.metrics, key=lambda m: m.epoch)
+        sorted_metrics = metrics_by_experiment[exp.id]
         epochs = [m.epoch for m in sorted_metrics]
         values = [getattr(m, metric_name.lower()) for m in sorted_metrics]
         plt.plot(epochs, values, label=exp.name, marker='o')
@@ -63,61 +69,144 @@ def generate_metric_line_chart(metric_name, experiments, output_dir="C:/tmp"):
     return Path(file_path).as_uri()
 
 
-@router.get("/projects/{project_id}/report", response_class=Response)
-def generate_project_report(project_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    # Verify project access
+# No query_budget: archiving is a fixed number of statements per experiment, in one transaction each
+@router.post("/projects/{project_id}/archive")
+def archive_project(project_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     project = db.query(Project).filter(Project.id == project_id, Project.user_id == current_user.id).first()
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
 
-    # Fetch experiments
     experiments = db.query(Experiment).filter(
         Experiment.project_id == project.id,
-        Experiment.user_id == current_user.id
+        Experiment.user_id == current_user.id,
+        Experiment.archived_at.is_(None)
     ).all()
+    # One transaction per experiment keeps locks short on large projects
+    archived = 0
+    for exp in experiments:
+        # False if a concurrent request archived it after the query above
+        archived += archive_experiment(db, exp)
+        db.commit()
+    return {"status": "project archived", "archived_experiments": archived}
+
+
+@router.get("/projects/{project_id}/models/bundle", dependencies=[Depends(query_budget(3))])
+def download_project_models(project_id: int, fmt: str = Query("zip", alias="format", pattern="^(zip|tar)$"),
+                            db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    project = db.query(Project.id).filter(Project.id == project_id, Project.user_id == current_user.id).first()
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    checkpoints = db.query(Experiment.name, ModelFile.experiment_id, ModelFile.version, ModelFile.is_best,
+                           ModelFile.file_path).join(Experiment, ModelFile.experiment_id == Experiment.id).filter(
+        Experiment.project_id == project_id,
+        Experiment.user_id == current_user.id
+    ).order_by(ModelFile.experiment_id, ModelFile.version).all()
+
+    # The checkpoint flagged best for each experiment, or its latest one if none is flagged
+    best = {}
+    for c in checkpoints:
+        if c.is_best or not best.get(c.experiment_id, c).is_best:
+            best[c.experiment_id] = c
+    # Generated experiment names can repeat, so the folder also carries the experiment id
+    entries = [
+        (checkpoint_arcname(f"{c.name}-{c.experiment_id}", c.version, c.file_path), c.file_path)
+        for c in best.values() if os.path.exists(c.file_path)
+    ]
+    if not entries:
+        raise HTTPException(status_code=404, detail="No models found for this project")
+
+    return StreamingResponse(stream_bundle(entries, fmt), media_type=MEDIA_TYPES[fmt], headers={
+        "Content-Disposition": f"attachment; filename=project_{project_id}_models.{fmt}"
+    })
+
+
+@router.get("/projects/{project_id}/resource-usage/summary", dependencies=[Depends(query_budget(9))])
+def get_project_resource_usage_summary(project_id: int, db: Session = Depends(get_db),
+                                       current_user: User = Depends(get_current_user)):
+    project = db.query(Project).filter(Project.id == project_id, Project.user_id == current_user.id).first()
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    experiment_ids = [row.id for row in db.query(Experiment.id).filter(
+        Experiment.project_id == project.id,
+        Experiment.user_id == current_user.id
+    )]
+    summaries = get_summaries(db, experiment_ids)
+    return {
+        "project_id": project_id,
+        "experiment_count": len(experiment_ids),
+        **describe(merge_stats(s.stats for s in summaries)),
+        "experiments": [
+            {"experiment_id": s.experiment_id, "total_training_time_sec": s.total_training_time_sec,
+             "peak_memory_mb": s.peak_memory_mb, "peak_gpu_memory_mb": s.peak_gpu_memory_mb}
+            for s in summaries
+        ],
+    }
+
+
+@router.get("/projects/{project_id}/report", response_class=Response, dependencies=[Depends(query_budget(5))])
+def generate_project_report(project_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    # Verify project access
+    project = db.query(Project).filter(Project.id == project_id, Project.user_id == current_user.id).first()
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    with stage("query_experiments"):
+        # Fetch experiments
+        experiments = db.query(Experiment).filter(
+            Experiment.project_id == project.id,
+            Experiment.user_id == current_user.id
+        ).all()
 
     if not experiments:
         raise HTTPException(status_code=404, detail="No experiments found for this project")
 
-    # Compute stats
-    data = []
-    for exp in experiments:
-        metrics = sorted(exp.metrics, key=lambda m: m.epoch)
-        if not metrics:
-            continue
-        avg_accuracy = sum(m.accuracy for m in metrics) / len(metrics)
-        avg_precision = sum(m.precision for m in metrics) / len(metrics)
-        avg_recall = sum(m.recall for m in metrics) / len(metrics)
-        final_loss = metrics[-1].loss
-        data.append({
-            "name": exp.name,
-            "accuracy": round(avg_accuracy, 4),
-            "precision": round(avg_precision, 4),
-            "recall": round(avg_recall, 4),
-            "loss": round(final_loss, 4)
-        })
-
-    top5_data = sorted(data, key=lambda x: x["accuracy"], reverse=True)[:5]
-    top5_names = [d["name"] for d in top5_data]
-    top5_experiments = [e for e in experiments if e.name in top5_names]
-
-    # Summary
-    total = len(data)
-    avg_acc = round(sum(d["accuracy"] for d in data) / total, 4)
-    avg_recall = round(sum(d["recall"] for d in data) / total, 4)
-    best_acc = max(d["accuracy"] for d in data)
-    best_recall = max(d["recall"] for d in data)
-
-    # Bar Charts
-    acc_path = generate_chart("Accuracy", [d["accuracy"] for d in top5_data], top5_names)
-    rec_path = generate_chart("Recall", [d["recall"] for d in top5_data], top5_names)
-    prec_path = generate_chart("Precision", [d["precision"] for d in top5_data], top5_names)
-
-    # Line Charts (metric-specific)
-    acc_line_path = generate_metric_line_chart("Accuracy", top5_experiments)
-    prec_line_path = generate_metric_line_chart("Precision", top5_experiments)
-    rec_line_path = generate_metric_line_chart("Recall", top5_experiments)
-    loss_line_path = generate_metric_line_chart("Loss", top5_experiments)
+    with stage("load_metrics"):
+        # Series come back sorted by epoch, archived experiments included
+        metrics_by_experiment = load_metrics(db, experiments)
+
+    with stage("aggregate"):
+        # Compute stats
+        data = []
+        for exp in experiments:
+            metrics = metrics_by_experiment[exp.id]
+            if not metrics:
+                continue
+            avg_accuracy = sum(m.accuracy for m in metrics) / len(metrics)
+            avg_precision = sum(m.precision for m in metrics) / len(metrics)
+            avg_recall = sum(m.recall for m in metrics) / len(metrics)
+            final_loss = metrics[-1].loss
+            data.append({
+                "name": exp.name,
+                "accuracy": round(avg_accuracy, 4),
+                "precision": round(avg_precision, 4),
+                "recall": round(avg_recall, 4),
+                "loss": round(final_loss, 4)
+            })
+
+        top5_data = sorted(data, key=lambda x: x["accuracy"], reverse=True)[:5]
+        top5_names = [d["name"] for d in top5_data]
+        top5_experiments = [e for e in experiments if e.name in top5_names]
+
+        # Summary
+        total = len(data)
+        avg_acc = round(sum(d["accuracy"] for d in data) / total, 4)
+        avg_recall = round(sum(d["recall"] for d in data) / total, 4)
+        best_acc = max(d["accuracy"] for d in data)
+        best_recall = max(d["recall"] for d in data)
+
+    with stage("charts"):
+        # Bar Charts
+        acc_path = generate_chart("Accuracy", [d["accuracy"] for d in top5_data], top5_names)
+        rec_path = generate_chart("Recall", [d["recall"] for d in top5_data], top5_names)
+        prec_path = generate_chart("Precision", [d["precision"] for d in top5_data], top5_names)
+
+        # Line Charts (metric-specific)
+        acc_line_path = generate_metric_line_chart("Accuracy", top5_experiments, metrics_by_experiment)
+        prec_line_path = generate_metric_line_chart("Precision", top5_experiments, metrics_by_experiment)
+        rec_line_path = generate_metric_line_chart("Recall", top5_experiments, metrics_by_experiment)
+        loss_line_path = generate_metric_line_chart("Loss", top5_experiments, metrics_by_experiment)
 
     # Template
     template_str = """
@@ -162,27 +251,29 @@ def generate_project_report(project_id: int, db: Session = Depends(get_db), curr
     </body></html>
     """
 
-    html = Template(template_str).render(
-        date=datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S UTC"),
-        user={"username": current_user.username, "email": current_user.email},
-        experiments=top5_data,
-        summary={
-            "total": total,
-            "best_acc": best_acc,
-            "best_recall": best_recall,
-            "avg_acc": avg_acc,
-            "avg_recall": avg_recall,
-        },
-        acc_chart=acc_path,
-        rec_chart=rec_path,
-        prec_chart=prec_path,
-        acc_line=acc_line_path,
-        prec_line=prec_line_path,
-        rec_line=rec_line_path,
-        loss_line=loss_line_path
-    )
-
-    pdf_bytes = HTML(string=html, base_url="/").write_pdf()
+    with stage("render_html"):
+        html = Template(template_str).render(
+            date=datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S UTC"),
+            user={"username": current_user.username, "email": current_user.email},
+            experiments=top5_data,
+            summary={
+                "total": total,
+                "best_acc": best_acc,
+                "best_recall": best_recall,
+                "avg_acc": avg_acc,
+                "avg_recall": avg_recall,
+            },
+            acc_chart=acc_path,
+            rec_chart=rec_path,
+            prec_chart=prec_path,
+            acc_line=acc_line_path,
+            prec_line=prec_line_path,
+            rec_line=rec_line_path,
+            loss_line=loss_line_path
+        )
+
+    with stage("render_pdf"):
+        pdf_bytes = HTML(string=html, base_url="/").write_pdf()
 
     return Response(content=pdf_bytes, media_type="application/pdf", headers={
         "Content-Disposition": f"attachment; filename=project_{project_id}_report.pdf"
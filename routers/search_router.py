@@ -0,0 +1,29 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+from typing import Optional
+from database import get_db
+from models import User
+from auth import get_current_user
+from query_budget import query_budget
+from search import search, KINDS
+
+router = APIRouter(tags=["Search"])
+
+
+@router.get("/search", dependencies=[Depends(query_budget(2))])
+def search_experiments_and_projects(
+    q: str = Query(..., min_length=1, max_length=200),
+    kind: Optional[str] = Query(None, alias="type", pattern="^(experiment|project)$",
+                                description="Only return one kind of hit"),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=1000),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    # One extra row tells us whether there is a next page without a separate COUNT
+    hits = search(db, current_user.id, q, kinds=(kind,) if kind else KINDS, limit=limit + 1, offset=offset)
+    return {
+        "query": q,
+        "hits": hits[:limit],
+        "next_offset": offset + limit if len(hits) > limit else None,
+    }
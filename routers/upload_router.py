@@ -1,12 +1,56 @@
 from fastapi import Query, APIRouter, Depends, HTTPException, UploadFile, File, Header
+from pydantic import BaseModel
+from sqlalchemy import func
 from sqlalchemy.orm import Session
+from typing import Any, Dict, List, Optional
 from database import get_db
-from models import User, Experiment, Metric, ModelFile, Project, ResourceUsage
+from models import User, Experiment, ModelFile, Project
+from rate_limit import admission_control, get_throttle_stats
+from query_budget import query_budget
+from ingest import upsert_metrics, upsert_resource_usage, claim_idempotency_key, complete_idempotency_key
+from hyperparams import set_hyperparameters, add_tags
+from archive import lock_for_ingest
 import shutil, os
+import json
 import random
+import uuid
 
 
-router = APIRouter(tags=["Uploads"])
+# Every ingest route is admitted (or shed with a 429) before its handler opens a DB session
+router = APIRouter(tags=["Uploads"], dependencies=[Depends(admission_control)])
+
+
+class MetricPoint(BaseModel):
+    epoch: int
+    accuracy: float
+    precision: float
+    recall: float
+    loss: float
+
+
+class MetricBatch(BaseModel):
+    experiment_id: int
+    points: List[MetricPoint]
+
+
+class ResourceUsagePoint(BaseModel):
+    epoch: int
+    cpu_usage_percent: Optional[float] = None
+    memory_usage_mb: Optional[float] = None
+    gpu_usage_percent: Optional[float] = None
+    gpu_memory_usage_mb: Optional[float] = None
+    training_time_sec: Optional[float] = None
+
+
+class ResourceUsageBatch(BaseModel):
+    experiment_id: int
+    points: List[ResourceUsagePoint]
+
+
+class ExperimentMetadata(BaseModel):
+    hyperparameters: Dict[str, Any] = {}
+    tags: List[str] = []
+
 
 adjectives = [
     "brave", "calm", "eager", "fancy", "glad", "jolly", "kind", "lucky", "mighty", "noble",
@@ -28,7 +72,7 @@ def generate_human_readable_name():
 def get_user_by_api_key(db: Session, api_key: str):
     return db.query(User).filter(User.api_key == api_key).first()
 
-@router.post("/projects")
+@router.post("/projects", dependencies=[Depends(query_budget(3))])
 def create_project(name: str, description: str, x_api_key: str = Header(...), db: Session = Depends(get_db)):
     user = get_user_by_api_key(db, x_api_key)
     if not user:
@@ -39,33 +83,65 @@ def create_project(name: str, description: str, x_api_key: str = Header(...), db
     db.refresh(project)
     return {"project_id": project.id}
 
-@router.post("/experiments")
-def create_experiment(project_id: int, description: str, x_api_key: str = Header(...), db: Session = Depends(get_db)):
+@router.post("/experiments", dependencies=[Depends(query_budget(7))])
+def create_experiment(project_id: int, description: str, metadata: Optional[ExperimentMetadata] = None,
+                      x_api_key: str = Header(...), db: Session = Depends(get_db)):
     user = get_user_by_api_key(db, x_api_key)
     if not user:
         raise HTTPException(status_code=403, detail="Invalid API Key")
     experiment = Experiment(name=generate_human_readable_name(), description=description, owner=user, project_id=project_id)
     db.add(experiment)
+    if metadata:
+        db.flush()
+        set_hyperparameters(db, experiment.id, metadata.hyperparameters)
+        add_tags(db, experiment.id, metadata.tags)
     db.commit()
     db.refresh(experiment)
     return {"experiment_id": experiment.id}
 
 
-@router.post("/metrics")
+@router.post("/experiments/{experiment_id}/metadata", dependencies=[Depends(query_budget(6))])
+def update_experiment_metadata(experiment_id: int, metadata: ExperimentMetadata, x_api_key: str = Header(...),
+                               db: Session = Depends(get_db)):
+    """Add or overwrite hyperparameters and add tags; keys and tags not mentioned are kept."""
+    user = get_user_by_api_key(db, x_api_key)
+    if not user:
+        raise HTTPException(status_code=403, detail="Invalid API Key")
+    if not db.query(Experiment.id).filter_by(id=experiment_id, user_id=user.id).first():
+        raise HTTPException(status_code=404, detail="Experiment not found")
+    set_hyperparameters(db, experiment_id, metadata.hyperparameters)
+    add_tags(db, experiment_id, metadata.tags)
+    db.commit()
+    return {"status": "metadata updated"}
+
+
+@router.post("/metrics", dependencies=[Depends(query_budget(7))])
 def add_metric(experiment_id: int, epoch: int, accuracy: float, precision: float, recall: float, loss: float,
-               x_api_key: str = Header(...), db: Session = Depends(get_db)):
+               x_api_key: str = Header(...), idempotency_key: Optional[str] = Header(None),
+               db: Session = Depends(get_db)):
     user = get_user_by_api_key(db, x_api_key)
-    experiment = db.query(Experiment).filter_by(id=experiment_id, user_id=user.id).first()
+    if not user:
+        raise HTTPException(status_code=403, detail="Invalid API Key")
+    experiment = lock_for_ingest(db, experiment_id, user.id)
     if not experiment:
         raise HTTPException(status_code=404, detail="Experiment not found")
-    metric = Metric(experiment_id=experiment_id, epoch=epoch, accuracy=accuracy, precision=precision, recall=recall,
-                    loss=loss)
-    db.add(metric)
+    if experiment.archived_at:
+        raise HTTPException(status_code=409, detail="Experiment is archived")
+    if idempotency_key:
+        stored = claim_idempotency_key(db, user.id, idempotency_key, "/metrics")
+        if stored is not None:
+            return stored
+
+    upsert_metrics(db, experiment_id, [{"epoch": epoch, "accuracy": accuracy, "precision": precision,
+                                        "recall": recall, "loss": loss}])
+    response = {"status": "metric added"}
+    if idempotency_key:
+        complete_idempotency_key(db, user.id, idempotency_key, response)
     db.commit()
-    return {"status": "metric added"}
+    return response
 
 
-@router.post("/resource-usage")
+@router.post("/resource-usage", dependencies=[Depends(query_budget(16))])
 def add_resource_usage(
         experiment_id: int,
         epoch: int,
@@ -75,45 +151,138 @@ def add_resource_usage(
         gpu_memory_used_mb: float = Query(None, alias="gpu_memory_usage_mb"),
         training_time_sec: float = Query(None),
         x_api_key: str = Header(...),
+        idempotency_key: Optional[str] = Header(None),
         db: Session = Depends(get_db)
 ):
     user = get_user_by_api_key(db, x_api_key)
+    if not user:
+        raise HTTPException(status_code=403, detail="Invalid API Key")
 
-    experiment = db.query(Experiment).filter_by(id=experiment_id, user_id=user.id).first()
+    experiment = lock_for_ingest(db, experiment_id, user.id)
+    if not experiment:
+        raise HTTPException(status_code=404, detail="Experiment not found")
+    if experiment.archived_at:
+        raise HTTPException(status_code=409, detail="Experiment is archived")
+    if idempotency_key:
+        stored = claim_idempotency_key(db, user.id, idempotency_key, "/resource-usage")
+        if stored is not None:
+            return stored
+
+    upsert_resource_usage(db, experiment_id, [{
+        "epoch": epoch,
+        "cpu_usage_percent": cpu_percent,
+        "memory_usage_mb": memory_used_mb,
+        "gpu_usage_percent": gpu_percent,
+        "gpu_memory_usage_mb": gpu_memory_used_mb,
+        "training_time_sec": training_time_sec,
+    }])
+    response = {"status": "resource usage added"}
+    if idempotency_key:
+        complete_idempotency_key(db, user.id, idempotency_key, response)
+    db.commit()
+    return response
+
+
+@router.post("/metrics/batch", dependencies=[Depends(query_budget(7))])
+def add_metrics_batch(batch: MetricBatch, x_api_key: str = Header(...), idempotency_key: Optional[str] = Header(None),
+                      db: Session = Depends(get_db)):
+    user = get_user_by_api_key(db, x_api_key)
+    if not user:
+        raise HTTPException(status_code=403, detail="Invalid API Key")
+    experiment = lock_for_ingest(db, batch.experiment_id, user.id)
+    if not experiment:
+        raise HTTPException(status_code=404, detail="Experiment not found")
+    if experiment.archived_at:
+        raise HTTPException(status_code=409, detail="Experiment is archived")
+    if idempotency_key:
+        stored = claim_idempotency_key(db, user.id, idempotency_key, "/metrics/batch")
+        if stored is not None:
+            return stored
+
+    count = upsert_metrics(db, batch.experiment_id, [point.model_dump() for point in batch.points])
+    response = {"status": "metrics added", "count": count}
+    if idempotency_key:
+        complete_idempotency_key(db, user.id, idempotency_key, response)
+    db.commit()
+    return response
+
+
+@router.post("/resource-usage/batch", dependencies=[Depends(query_budget(16))])
+def add_resource_usage_batch(batch: ResourceUsageBatch, x_api_key: str = Header(...),
+                             idempotency_key: Optional[str] = Header(None), db: Session = Depends(get_db)):
+    user = get_user_by_api_key(db, x_api_key)
+    if not user:
+        raise HTTPException(status_code=403, detail="Invalid API Key")
+    experiment = lock_for_ingest(db, batch.experiment_id, user.id)
     if not experiment:
         raise HTTPException(status_code=404, detail="Experiment not found")
+    if experiment.archived_at:
+        raise HTTPException(status_code=409, detail="Experiment is archived")
+    if idempotency_key:
+        stored = claim_idempotency_key(db, user.id, idempotency_key, "/resource-usage/batch")
+        if stored is not None:
+            return stored
 
-    resource = ResourceUsage(
-        experiment_id=experiment_id,
-        epoch=epoch,
-        cpu_usage_percent=cpu_percent,
-        memory_usage_mb=memory_used_mb,
-        gpu_usage_percent=gpu_percent,
-        gpu_memory_usage_mb=gpu_memory_used_mb,
-        training_time_sec=training_time_sec
-    )
-    db.add(resource)
+    count = upsert_resource_usage(db, batch.experiment_id, [point.model_dump() for point in batch.points])
+    response = {"status": "resource usage added", "count": count}
+    if idempotency_key:
+        complete_idempotency_key(db, user.id, idempotency_key, response)
     db.commit()
-    return {"status": "resource usage added"}
-@router.post("/upload_model")
-def upload_model(experiment_id: int, file: UploadFile = File(...), x_api_key: str = Header(...),
+    return response
+
+
+@router.post("/upload_model", dependencies=[Depends(query_budget(6))])
+def upload_model(experiment_id: int, epoch: Optional[int] = None, is_best: bool = False,
+                 metadata: Optional[str] = None, file: UploadFile = File(...), x_api_key: str = Header(...),
                  db: Session = Depends(get_db)):
     user = get_user_by_api_key(db, x_api_key)
+    if not user:
+        raise HTTPException(status_code=403, detail="Invalid API Key")
     experiment = db.query(Experiment).filter_by(id=experiment_id, user_id=user.id).first()
     if not experiment:
         raise HTTPException(status_code=404, detail="Experiment not found")
+    try:
+        details = json.loads(metadata) if metadata else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="metadata must be valid JSON")
 
-    file_location = f"models/{experiment_id}_{file.filename}"
-    # Extract the directory part of the file path
-    directory = os.path.dirname(file_location)
-
-    # Create the directory (and all intermediate directories) if they don't exist
+    # Every upload is kept as a new checkpoint version under models/<experiment_id>/
+    directory = f"models/{experiment_id}"
     os.makedirs(directory, exist_ok=True)
 
-    with open(file_location, "wb") as buffer:
+    # A part sent without a filename has file.filename None (or "")
+    filename = os.path.basename(file.filename or "") or "model"
+    # Stream to a temporary name first; the version is only known once the experiment row is locked
+    tmp_location = f"{directory}/.upload-{uuid.uuid4().hex}"
+    with open(tmp_location, "wb") as buffer:
         shutil.copyfileobj(file.file, buffer)
-    model_file = ModelFile(experiment_id=experiment_id, file_path=file_location)
+
+    try:
+        db.query(Experiment.id).filter_by(id=experiment_id).with_for_update().first()
+        version = (db.query(func.max(ModelFile.version)).filter_by(experiment_id=experiment_id).scalar() or 0) + 1
+        file_location = f"{directory}/v{version}_{filename}"
+        os.replace(tmp_location, file_location)
+    except Exception:
+        os.remove(tmp_location)
+        raise
+
+    if is_best:
+        db.query(ModelFile).filter_by(experiment_id=experiment_id, is_best=True).update({"is_best": False})
+    model_file = ModelFile(experiment_id=experiment_id, file_path=file_location, version=version, epoch=epoch,
+                           is_best=is_best, size_bytes=os.path.getsize(file_location), details=details)
     db.add(model_file)
-    db.commit()
-    return {"status": "model uploaded"}
+    try:
+        db.commit()
+    except Exception:
+        os.remove(file_location)
+        raise
+    return {"status": "model uploaded", "version": version}
+
+
+@router.get("/rate-limits", dependencies=[Depends(query_budget(1))])
+def get_rate_limit_stats(x_api_key: str = Header(...), db: Session = Depends(get_db)):
+    user = get_user_by_api_key(db, x_api_key)
+    if not user:
+        raise HTTPException(status_code=403, detail="Invalid API Key")
+    return {"throttled": get_throttle_stats()}
 
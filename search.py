@@ -0,0 +1,79 @@
+from sqlalchemy import and_, case, func, literal, literal_column, null, or_, select, union_all
+from sqlalchemy.orm import Session
+
+from models import Experiment, Project
+
+# Must match the expression indexes created by the add_search_indexes migration
+TEXT_SEARCH_CONFIG = literal_column("'english'::regconfig")
+KINDS = ("experiment", "project")
+
+
+def _like_pattern(term: str) -> str:
+    escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def _postgres_select(model, kind: str, user_id: int, q: str):
+    """Hits for one table, using the pg_trgm index on name and the full-text index on description.
+
+    `name % q` catches typos, `name ILIKE '%q%'` catches fragments such as "otter" in
+    "jolly-otter"; both are served by the trigram index, which the planner combines with the
+    full-text index in a bitmap OR.
+    """
+    document = func.to_tsvector(TEXT_SEARCH_CONFIG, func.coalesce(model.description, ""))
+    query = func.websearch_to_tsquery(TEXT_SEARCH_CONFIG, q)
+    name_score = func.greatest(func.similarity(model.name, q), func.word_similarity(q, model.name))
+    score = name_score + func.ts_rank(document, query)
+    return select(
+        literal(kind).label("kind"),
+        model.id.label("id"),
+        model.name.label("name"),
+        model.description.label("description"),
+        (Experiment.project_id if model is Experiment else null()).label("project_id"),
+        score.label("score"),
+    ).where(
+        model.user_id == user_id,
+        or_(model.name.op("%")(q), model.name.ilike(_like_pattern(q), escape="\\"), document.op("@@")(query)),
+    )
+
+
+def _fallback_select(model, kind: str, user_id: int, q: str):
+    """LIKE-based equivalent for SQLite (tests and local development): every word must appear
+    in the name or description; name matches rank above description matches."""
+    words = q.lower().split()
+    name = func.lower(func.coalesce(model.name, ""))
+    description = func.lower(func.coalesce(model.description, ""))
+    score = sum(
+        case((name == word, 1.0), (name.like(_like_pattern(word), escape="\\"), 0.6), else_=0.0)
+        + case((description.like(_like_pattern(word), escape="\\"), 0.2), else_=0.0)
+        for word in words
+    ) / len(words)
+    return select(
+        literal(kind).label("kind"),
+        model.id.label("id"),
+        model.name.label("name"),
+        model.description.label("description"),
+        (Experiment.project_id if model is Experiment else null()).label("project_id"),
+        score.label("score"),
+    ).where(
+        model.user_id == user_id,
+        and_(*(
+            or_(name.like(_like_pattern(word), escape="\\"), description.like(_like_pattern(word), escape="\\"))
+            for word in words
+        )),
+    )
+
+
+def search(db: Session, user_id: int, q: str, kinds=KINDS, limit: int = 20, offset: int = 0) -> list:
+    """Ranked experiment and project hits for `q` in one statement, best match first."""
+    q = q.strip()
+    if not q:
+        return []
+    build = _postgres_select if db.get_bind().dialect.name == "postgresql" else _fallback_select
+    models = {"experiment": Experiment, "project": Project}
+    selects = [build(models[kind], kind, user_id, q) for kind in kinds]
+    hits = (union_all(*selects) if len(selects) > 1 else selects[0]).subquery()
+    rows = db.execute(
+        select(hits).order_by(hits.c.score.desc(), hits.c.kind, hits.c.id.desc()).limit(limit).offset(offset)
+    ).mappings().all()
+    return [dict(row, score=round(float(row["score"]), 4)) for row in rows]
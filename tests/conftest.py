@@ -0,0 +1,107 @@
+import os
+import sys
+import types
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import StaticPool
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class _StubHTML:
+    """Stands in for weasyprint.HTML, whose PDF rendering needs system Pango libraries."""
+
+    def __init__(self, string=None, **kwargs):
+        self.string = string
+
+    def write_pdf(self):
+        return b"%PDF-1.7\n%stub\n"
+
+
+sys.modules.setdefault("weasyprint", types.SimpleNamespace(HTML=_StubHTML))
+
+import database
+
+# One shared in-memory database; bound before main is imported so create_all never sees Postgres
+engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+database.engine = engine
+database.SessionLocal.configure(bind=engine)
+
+import main  # noqa: E402
+import rate_limit  # noqa: E402
+from auth import create_access_token  # noqa: E402
+from database import Base, SessionLocal  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from models import User  # noqa: E402
+
+
+class StatementCounter:
+    """Counts SQL statements sent to the test database."""
+
+    def __init__(self):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._count)
+
+    def _count(self, *args):
+        self.count += 1
+
+    def close(self):
+        event.remove(engine, "before_cursor_execute", self._count)
+
+
+@pytest.fixture
+def db():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    rate_limit.backend = rate_limit.InMemoryBackend()
+    rate_limit.api_keys.clear()
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture(scope="session")
+def app_client():
+    # Started once: the lifespan spawns the bcrypt worker processes
+    with TestClient(main.app) as client:
+        yield client
+
+
+@pytest.fixture
+def client(db, app_client):
+    return app_client
+
+
+@pytest.fixture
+def user(db):
+    user = User(username="alice", email="alice@example.com", hashed_password="x", api_key="test-key")
+    db.add(user)
+    db.commit()
+    return user
+
+
+@pytest.fixture
+def auth_headers(user):
+    return {"Authorization": f"Bearer {create_access_token({'sub': str(user.id)})}", "X-API-Key": "test-key"}
+
+
+@pytest.fixture
+def experiment(client, auth_headers):
+    """(project_id, experiment_id) of an empty experiment owned by `user`."""
+    project_id = client.post("/projects", params={"name": "vision", "description": ""},
+                             headers=auth_headers).json()["project_id"]
+    experiment_id = client.post("/experiments", params={"project_id": project_id, "description": ""},
+                                headers=auth_headers).json()["experiment_id"]
+    return project_id, experiment_id
+
+
+@pytest.fixture
+def statements():
+    counter = StatementCounter()
+    try:
+        yield counter
+    finally:
+        counter.close()
@@ -0,0 +1,35 @@
+def create_experiment(client, auth_headers):
+    project_id = client.post("/projects", params={"name": "vision", "description": ""},
+                             headers=auth_headers).json()["project_id"]
+    experiment_id = client.post("/experiments", params={"project_id": project_id, "description": ""},
+                                headers=auth_headers).json()["experiment_id"]
+    points = [{"epoch": epoch, "accuracy": 0.9, "precision": 0.8, "recall": 0.7, "loss": 0.1} for epoch in range(3)]
+    assert client.post("/metrics/batch", json={"experiment_id": experiment_id, "points": points},
+                       headers=auth_headers).status_code == 200
+    return project_id, experiment_id
+
+
+def test_archived_series_is_read_back_and_ingest_is_rejected(client, auth_headers):
+    _, experiment_id = create_experiment(client, auth_headers)
+    before = client.get(f"/experiments/{experiment_id}/metrics", headers=auth_headers).json()
+
+    assert client.post(f"/experiments/{experiment_id}/archive", headers=auth_headers).json() == {
+        "status": "experiment archived"}
+    after = client.get(f"/experiments/{experiment_id}/metrics", headers=auth_headers).json()
+    # Archived rows no longer have their own primary keys
+    assert after == [{k: v for k, v in metric.items() if k != "id"} for metric in before]
+
+    point = {"epoch": 3, "accuracy": 0.9, "precision": 0.8, "recall": 0.7, "loss": 0.1}
+    response = client.post("/metrics/batch", json={"experiment_id": experiment_id, "points": [point]},
+                           headers=auth_headers)
+    assert response.status_code == 409
+
+
+def test_archiving_twice_reports_already_archived(client, auth_headers):
+    project_id, experiment_id = create_experiment(client, auth_headers)
+    assert client.post(f"/experiments/{experiment_id}/archive", headers=auth_headers).json() == {
+        "status": "experiment archived"}
+    assert client.post(f"/experiments/{experiment_id}/archive", headers=auth_headers).json() == {
+        "status": "experiment already archived"}
+    assert client.post(f"/projects/{project_id}/archive", headers=auth_headers).json() == {
+        "status": "project archived", "archived_experiments": 0}
@@ -0,0 +1,18 @@
+import auth
+
+
+def test_hash_pool_is_started_with_spawned_workers(client):
+    assert auth._hash_pool is not None
+    assert auth._hash_pool._mp_context.get_start_method() == "spawn"
+
+
+def test_register_and_login_hash_in_the_pool(client):
+    form = {"username": "bob", "email": "bob@example.com", "password": "s3cret"}
+    assert client.post("/register", data=form).status_code == 200
+
+    response = client.post("/token", data={"username": "bob", "password": "s3cret"})
+    assert response.status_code == 200
+    token = response.json()["access_token"]
+    assert client.get("/validate-token", headers={"Authorization": f"Bearer {token}"}).status_code == 200
+
+    assert client.post("/token", data={"username": "bob", "password": "wrong"}).status_code == 400
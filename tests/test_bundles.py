@@ -0,0 +1,104 @@
+import io
+import tarfile
+import zipfile
+
+import pytest
+from fastapi import UploadFile
+
+from models import Experiment, ModelFile
+from routers import upload_router
+
+
+@pytest.fixture
+def checkpoints(db, experiment, tmp_path):
+    """Three checkpoints of `experiment` (v2 flagged best) and two of a second experiment (none best)."""
+    project_id, experiment_id = experiment
+    other = Experiment(name="jolly-otter", description="", user_id=db.get(Experiment, experiment_id).user_id,
+                       project_id=project_id)
+    db.add(other)
+    db.flush()
+    contents = {}
+    for exp_id, versions, best in ((experiment_id, (1, 2, 3), 2), (other.id, (1, 2), None)):
+        for version in versions:
+            data = f"weights of {exp_id} v{version}".encode() * version
+            path = tmp_path / f"v{version}_model-{exp_id}.pt"
+            path.write_bytes(data)
+            db.add(ModelFile(experiment_id=exp_id, file_path=str(path), version=version, is_best=version == best,
+                             size_bytes=len(data)))
+            contents[(exp_id, version)] = data
+    db.commit()
+    return project_id, experiment_id, other.id, contents
+
+
+def read_zip(content):
+    archive = zipfile.ZipFile(io.BytesIO(content))
+    assert archive.testzip() is None
+    return {info.filename: archive.read(info) for info in archive.infolist()}
+
+
+def read_tar(content):
+    with tarfile.open(fileobj=io.BytesIO(content)) as archive:
+        return {member.name: archive.extractfile(member).read() for member in archive.getmembers()}
+
+
+@pytest.mark.parametrize("fmt, read", [("zip", read_zip), ("tar", read_tar)])
+def test_experiment_bundle(client, auth_headers, checkpoints, fmt, read):
+    project_id, experiment_id, _, contents = checkpoints
+    name = client.get(f"/projects/{project_id}/experiments", headers=auth_headers).json()[0]["name"]
+    response = client.get(f"/experiments/{experiment_id}/checkpoints/bundle", params={"format": fmt},
+                          headers=auth_headers)
+    assert response.status_code == 200
+    assert response.headers["content-disposition"] == (
+        f"attachment; filename=experiment_{experiment_id}_checkpoints.{fmt}")
+    members = read(response.content)
+    assert members == {f"{name}/v{v}_model-{experiment_id}.pt": contents[(experiment_id, v)] for v in (1, 2, 3)}
+
+
+@pytest.mark.parametrize("fmt, read", [("zip", read_zip), ("tar", read_tar)])
+def test_experiment_bundle_selects_versions(client, auth_headers, checkpoints, fmt, read):
+    _, experiment_id, _, contents = checkpoints
+    response = client.get(f"/experiments/{experiment_id}/checkpoints/bundle",
+                          params={"format": fmt, "versions": "3, 1,9"}, headers=auth_headers)
+    members = read(response.content)
+    assert sorted(name.split("/")[1] for name in members) == [f"v1_model-{experiment_id}.pt",
+                                                              f"v3_model-{experiment_id}.pt"]
+    assert sorted(len(data) for data in members.values()) == sorted(
+        len(contents[(experiment_id, v)]) for v in (1, 3))
+
+
+def test_experiment_bundle_errors(client, auth_headers, checkpoints):
+    _, experiment_id, _, _ = checkpoints
+    url = f"/experiments/{experiment_id}/checkpoints/bundle"
+    assert client.get(url, params={"versions": "1,two"}, headers=auth_headers).status_code == 400
+    assert client.get(url, params={"versions": "9"}, headers=auth_headers).status_code == 404
+    assert client.get(url, params={"format": "rar"}, headers=auth_headers).status_code == 422
+
+
+@pytest.mark.parametrize("fmt, read", [("zip", read_zip), ("tar", read_tar)])
+def test_project_bundle_picks_best_checkpoint_or_latest(client, auth_headers, checkpoints, fmt, read):
+    project_id, experiment_id, other_id, contents = checkpoints
+    response = client.get(f"/projects/{project_id}/models/bundle", params={"format": fmt}, headers=auth_headers)
+    assert response.status_code == 200
+    members = read(response.content)
+    picked = {name.split("/")[0].rsplit("-", 1)[1]: (name.split("/")[1], data) for name, data in members.items()}
+    assert picked == {
+        str(experiment_id): (f"v2_model-{experiment_id}.pt", contents[(experiment_id, 2)]),
+        str(other_id): (f"v2_model-{other_id}.pt", contents[(other_id, 2)]),
+    }
+
+
+def test_upload_without_filename(db, experiment, tmp_path, monkeypatch):
+    # Clients send such a part as a plain form field, so call the handler the way a raw multipart part would reach it
+    monkeypatch.chdir(tmp_path)
+    _, experiment_id = experiment
+    result = upload_router.upload_model(experiment_id, file=UploadFile(io.BytesIO(b"weights"), filename=None),
+                                        x_api_key="test-key", db=db)
+    assert result == {"status": "model uploaded", "version": 1}
+    assert (tmp_path / f"models/{experiment_id}/v1_model").read_bytes() == b"weights"
+
+
+def test_upload_with_unknown_api_key(client, experiment):
+    _, experiment_id = experiment
+    response = client.post("/upload_model", params={"experiment_id": experiment_id},
+                           headers={"X-API-Key": "bogus"}, files={"file": ("model.pt", b"weights")})
+    assert response.status_code == 403
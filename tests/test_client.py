@@ -0,0 +1,90 @@
+import json
+import threading
+
+import pytest
+import requests
+
+from client import TrackingClient, _retry_after
+
+
+def make_client(tmp_path, deliver):
+    tracker = TrackingClient("http://127.0.0.1:9", "test-key", flush_interval=0.001,
+                             spool_path=str(tmp_path / "spool.jsonl"))
+    tracker._deliver = deliver
+    return tracker
+
+
+def test_flush_returns_only_after_every_logged_point_was_delivered(tmp_path):
+    delivered = []
+    lock = threading.Lock()
+
+    def deliver(kind, experiment_id, payloads):
+        with lock:
+            delivered.extend(payloads)
+        return True
+
+    tracker = make_client(tmp_path, deliver)
+    try:
+        # The uploader wakes up every millisecond, so flush() keeps racing with it going idle
+        for epoch in range(2000):
+            tracker.log_metrics(1, epoch, 0.9, 0.9, 0.9, 0.1)
+            assert tracker.flush(timeout=5)
+            with lock:
+                assert len(delivered) == epoch + 1
+    finally:
+        tracker.close()
+
+
+def test_undeliverable_points_are_spooled(tmp_path):
+    tracker = make_client(tmp_path, lambda kind, experiment_id, payloads: False)
+    for epoch in range(3):
+        tracker.log_metrics(1, epoch, 0.9, 0.9, 0.9, 0.1)
+    assert tracker.flush(timeout=5)
+    tracker.close()
+    assert len((tmp_path / "spool.jsonl").read_text().splitlines()) == 3
+
+
+def test_numpy_scalars_are_converted_when_logged(tmp_path):
+    import numpy as np
+
+    delivered = []
+    tracker = make_client(tmp_path, lambda kind, experiment_id, payloads: delivered.extend(payloads) or True)
+    try:
+        tracker.log_metrics(1, np.int64(0), np.float32(0.9), np.float32(0.8), np.float32(0.7), np.float64(0.1))
+        assert tracker.flush(timeout=5)
+    finally:
+        tracker.close()
+    assert json.dumps(delivered)
+    assert type(delivered[0]["accuracy"]) is float
+
+
+def test_flush_returns_when_delivery_raises(tmp_path):
+    def deliver(kind, experiment_id, payloads):
+        json.dumps({"points": [object()]})
+
+    tracker = make_client(tmp_path, deliver)
+    try:
+        tracker.log_metrics(1, 0, 0.9, 0.9, 0.9, 0.1)
+        tracker.log_resource_usage(1, 0, cpu_usage_percent=50)
+        assert tracker.flush(timeout=5)
+        assert tracker._handled == tracker._enqueued == 2
+    finally:
+        tracker.close()
+
+
+def test_bad_input_fails_in_the_caller(tmp_path):
+    tracker = make_client(tmp_path, lambda kind, experiment_id, payloads: True)
+    try:
+        with pytest.raises(TypeError):
+            tracker.log_metrics(1, 0, object(), 0.9, 0.9, 0.1)
+        assert tracker.flush(timeout=5)
+    finally:
+        tracker.close()
+
+
+def test_non_numeric_retry_after_falls_back_to_backoff():
+    response = requests.Response()
+    response.headers["Retry-After"] = "Wed, 21 Oct 2015 07:28:00 GMT"
+    assert _retry_after(response) == 0
+    response.headers["Retry-After"] = "3"
+    assert _retry_after(response) == 3
@@ -0,0 +1,62 @@
+import gzip
+import tracemalloc
+import zlib
+
+import brotli
+import pytest
+
+from compression import PayloadTooLarge, decompress_body
+
+LIMIT = 1024 * 1024
+
+
+@pytest.mark.parametrize("encoding, compress", [("gzip", gzip.compress), ("br", brotli.compress)])
+def test_round_trip(encoding, compress):
+    body = b'{"points": []}' * 1000
+    assert decompress_body(compress(body), encoding, LIMIT) == body
+
+
+def test_brotli_bomb_is_rejected_without_inflating_it():
+    # ~200 bytes that expand to 64 MiB, most of it in a single brotli command
+    bomb = brotli.compress(b"\0" * 64 * 1024 * 1024, quality=5, lgwin=24)
+    assert len(bomb) < 1024
+
+    tracemalloc.start()
+    try:
+        with pytest.raises(PayloadTooLarge):
+            decompress_body(bomb, "br", LIMIT)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert peak < 4 * LIMIT
+
+
+def test_gzip_bomb_is_rejected():
+    bomb = gzip.compress(b"\0" * 64 * 1024 * 1024)
+    with pytest.raises(PayloadTooLarge):
+        decompress_body(bomb, "gzip", LIMIT)
+
+
+def test_brotli_bomb_on_ingest_route_gets_413(client):
+    bomb = brotli.compress(b"\0" * 64 * 1024 * 1024, quality=5, lgwin=24)
+    response = client.post("/metrics/batch", content=bomb,
+                           headers={"Content-Encoding": "br", "Content-Type": "application/json"})
+    assert response.status_code == 413
+
+
+@pytest.mark.parametrize("encoding, compress", [("gzip", gzip.compress), ("br", brotli.compress)])
+def test_truncated_body_is_rejected(encoding, compress):
+    body = compress(b'{"experiment_id": 1, "points": []}' * 100)
+    error = zlib.error if encoding == "gzip" else brotli.error
+    for size in (0, 10, len(body) // 2, len(body) - 1):
+        with pytest.raises(error):
+            decompress_body(body[:size], encoding, LIMIT)
+
+
+@pytest.mark.parametrize("encoding, compress", [("gzip", gzip.compress), ("br", brotli.compress)])
+def test_truncated_body_on_ingest_route_gets_400(client, encoding, compress):
+    body = compress(b'{"experiment_id": 1, "points": []}' * 100)
+    response = client.post("/metrics/batch", content=body[:30],
+                           headers={"Content-Encoding": encoding, "Content-Type": "application/json"})
+    assert response.status_code == 400
+    assert response.text == "Malformed compressed body"
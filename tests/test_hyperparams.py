@@ -0,0 +1,120 @@
+import pytest
+
+from hyperparams import add_tags, parse_filter, set_hyperparameters
+from models import Experiment, Project
+
+EXPERIMENTS = {
+    "a": ({"lr": 0.1, "optimizer": "adam", "seed": 42, "version": "10"}, ["baseline"]),
+    "b": ({"lr": 0.01, "optimizer": "sgd", "seed": 7, "nesterov": True}, ["baseline", "tuned"]),
+    "c": ({"lr": 0.001, "optimizer": "adam", "seed": 42.0}, []),
+    "d": ({"optimizer": "adamw", "nesterov": False}, ["tuned"]),
+}
+
+
+@pytest.fixture
+def project_id(db, user):
+    project = Project(name="vision", description="", owner=user)
+    db.add(project)
+    db.flush()
+    for name, (hyperparameters, tags) in EXPERIMENTS.items():
+        experiment = Experiment(name=name, description="", owner=user, project_id=project.id)
+        db.add(experiment)
+        db.flush()
+        set_hyperparameters(db, experiment.id, hyperparameters)
+        add_tags(db, experiment.id, tags)
+    db.commit()
+    return project.id
+
+
+def listing(client, auth_headers, project_id, **params):
+    response = client.get(f"/projects/{project_id}/experiments", params=params, headers=auth_headers)
+    assert response.status_code == 200, response.text
+    return response
+
+
+def names(client, auth_headers, project_id, filter_expr):
+    return sorted(e["name"] for e in listing(client, auth_headers, project_id, filter=filter_expr).json())
+
+
+def test_structured_values_round_trip(client, auth_headers, experiment):
+    _, experiment_id = experiment
+    hyperparameters = {"lr": 0.01, "epochs": 10, "nesterov": True, "optimizer": "adam", "layers": [1, 2],
+                       "schedule": {"type": "cosine", "warmup": 5}, "none": None, "looks_like_json": "[1, 2]"}
+    response = client.post(f"/experiments/{experiment_id}/metadata", headers=auth_headers,
+                           json={"hyperparameters": hyperparameters, "tags": []})
+    assert response.status_code == 200
+    [listed] = client.get("/projects/1/experiments", headers=auth_headers).json()
+    assert listed["hyperparameters"] == hyperparameters
+    assert type(listed["hyperparameters"]["epochs"]) is int
+
+
+@pytest.mark.parametrize("filter_expr, expected", [
+    ("optimizer=adam", ["a", "c"]),
+    ("lr<0.05", ["b", "c"]),
+    ("lr>=0.01 AND optimizer=adam", ["a"]),
+    # AND binds tighter than OR
+    ("optimizer=sgd OR optimizer=adam AND lr<0.05", ["b", "c"]),
+    ("(optimizer=sgd OR optimizer=adam) AND lr<0.05", ["b", "c"]),
+    ("(optimizer=sgd OR optimizer=adam) AND lr>0.05", ["a"]),
+    # NOT binds tighter than AND
+    ("NOT optimizer=adam AND lr>0", ["b"]),
+    ("NOT (optimizer=adam AND lr>0.05)", ["b", "c", "d"]),
+    ("not optimizer = adam and tag = tuned", ["b", "d"]),
+    # Unquoted numbers compare numerically, quoted ones as text
+    ("seed=42", ["a", "c"]),
+    ('seed="42"', ["a"]),
+    ("version>9", []),
+    ("version='10'", ["a"]),
+    ("nesterov=true", ["b"]),
+    ("nesterov=false", ["d"]),
+    ("tag=baseline", ["a", "b"]),
+    ("tag!=baseline", ["c", "d"]),
+    ("tag=baseline AND tag=tuned", ["b"]),
+    ("name=d OR id=1", ["a", "d"]),
+])
+def test_filter(client, auth_headers, project_id, filter_expr, expected):
+    assert names(client, auth_headers, project_id, filter_expr) == expected
+
+
+@pytest.mark.parametrize("filter_expr, message", [
+    ("", "Empty filter"),
+    ("lr<", "Expected a value after lr<"),
+    ("lr 0.1", "Expected op but found '0.1'"),
+    ("(lr<0.1", "Expected rparen but found 'end of filter'"),
+    ("lr<0.1)", "Unexpected ')'"),
+    ("lr<0.1 AND", "Expected word but found 'end of filter'"),
+    ("tag<x", "tags only support = and !="),
+    ("id=abc", "id must be a number, got 'abc'"),
+    ("lr<0.1 ; drop", "Unexpected input at position 6: ' ; drop'"),
+])
+def test_filter_errors(filter_expr, message):
+    with pytest.raises(ValueError) as excinfo:
+        parse_filter(filter_expr)
+    assert str(excinfo.value) == message
+
+
+def test_invalid_filter_is_a_400(client, auth_headers, project_id):
+    response = client.get(f"/projects/{project_id}/experiments", params={"filter": "lr<"}, headers=auth_headers)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid filter: Expected a value after lr<"
+
+
+def test_keyset_paging(client, auth_headers, project_id):
+    pages, after_id = [], None
+    while True:
+        params = {"limit": 3, "filter": "optimizer!=sgd"}
+        if after_id is not None:
+            params["after_id"] = after_id
+        response = listing(client, auth_headers, project_id, **params)
+        pages.append([e["name"] for e in response.json()])
+        after_id = response.headers.get("X-Next-Cursor")
+        if after_id is None:
+            break
+    assert pages == [["a", "c", "d"]]
+
+    first = listing(client, auth_headers, project_id, limit=2)
+    assert [e["name"] for e in first.json()] == ["a", "b"]
+    second = listing(client, auth_headers, project_id, limit=2, after_id=first.headers["X-Next-Cursor"])
+    assert [e["name"] for e in second.json()] == ["c", "d"]
+    assert "X-Next-Cursor" not in second.headers
+    assert listing(client, auth_headers, project_id).json()[0]["hyperparameters"] == EXPERIMENTS["a"][0]
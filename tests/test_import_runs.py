@@ -0,0 +1,118 @@
+import csv
+import gzip
+import itertools
+import json
+
+import pytest
+
+from import_runs import ImportRejected, _chunks, _parse_row, _read_rows
+
+FIELDS = ["project", "experiment", "epoch", "accuracy", "loss", "cpu_usage_percent", "timestamp"]
+ROWS = [
+    {"project": "vision", "experiment": "resnet", "epoch": "0", "accuracy": "0.5", "loss": "1.0",
+     "cpu_usage_percent": "", "timestamp": "2024-01-01T10:00:00"},
+    {"project": "vision", "experiment": "resnet", "epoch": "1", "accuracy": "0.6", "loss": "0.8",
+     "cpu_usage_percent": "75", "timestamp": ""},
+]
+
+
+def write_csv(path, rows, opener=open):
+    with opener(path, "wt", newline="") as f:
+        writer = csv.DictWriter(f, FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+    return str(path)
+
+
+def write_jsonl(path, lines, opener=open):
+    with opener(path, "wt") as f:
+        f.write("\n".join(lines) + "\n")
+    return str(path)
+
+
+def numbered_rows(n):
+    return [{"project": "vision", "experiment": "resnet", "epoch": str(i), "accuracy": "0.5"} for i in range(n)]
+
+
+def test_read_rows_csv_and_gzipped_csv(tmp_path):
+    assert list(_read_rows(write_csv(tmp_path / "runs.csv", ROWS))) == ROWS
+    assert list(_read_rows(write_csv(tmp_path / "runs.csv.gz", ROWS, gzip.open))) == ROWS
+
+
+def test_read_rows_jsonl_skips_blank_lines_and_yields_bad_json(tmp_path):
+    lines = [json.dumps({"project": "p", "experiment": "e", "epoch": 0}), "", "{not json", "[1, 2]"]
+    for name, opener in (("runs.jsonl", open), ("runs.ndjson.gz", gzip.open)):
+        rows = list(_read_rows(write_jsonl(tmp_path / name, lines, opener)))
+        assert rows == [{"project": "p", "experiment": "e", "epoch": 0}, {}, [1, 2]]
+
+
+def test_read_rows_rejects_unknown_file_types(tmp_path):
+    path = tmp_path / "runs.xlsx"
+    path.write_text("")
+    with pytest.raises(ValueError, match="Unsupported file type"):
+        list(_read_rows(str(path)))
+
+
+def test_parse_row():
+    parsed = _parse_row(ROWS[0])
+    assert parsed["project"] == "vision" and parsed["experiment"] == "resnet" and parsed["epoch"] == 0
+    assert parsed["timestamp"].isoformat() == "2024-01-01T10:00:00"
+    assert parsed["metrics"][:2] == [0.5, None]
+    assert all(value is None for value in parsed["resource_usage"])
+    assert _parse_row(ROWS[1])["timestamp"] is None
+    assert _parse_row(ROWS[1])["resource_usage"][0] == 75.0
+
+
+@pytest.mark.parametrize("row", [
+    [1, 2], None, "x", 3,
+    {},
+    {"project": "vision", "experiment": "resnet"},
+    {"project": " ", "experiment": "resnet", "epoch": 1},
+    {"project": "vision", "experiment": "resnet", "epoch": "one"},
+    {"project": "vision", "experiment": "resnet", "epoch": 1, "accuracy": "high"},
+    {"project": "vision", "experiment": "resnet", "epoch": 1, "timestamp": "yesterday"},
+])
+def test_parse_row_rejects_bad_rows(row):
+    with pytest.raises(ImportRejected):
+        _parse_row(row)
+
+
+def test_chunks_reject_bad_rows_without_aborting_the_file(tmp_path):
+    good = json.dumps({"project": "p", "experiment": "e", "epoch": 0})
+    path = write_jsonl(tmp_path / "runs.jsonl", [good, "[1, 2]", "null", '"x"', "{oops", good])
+    [(first_seq, chunk, rejected)] = list(_chunks(path, 0, 100))
+    assert first_seq == 0
+    assert [row is not None for row in chunk] == [True, False, False, False, False, True]
+    assert [row_number for row_number, _ in rejected] == [2, 3, 4, 5]
+
+
+def test_chunks_split_and_number_rows(tmp_path):
+    path = write_csv(tmp_path / "runs.csv", numbered_rows(7))
+    chunks = list(_chunks(path, 0, 3))
+    assert [(first_seq, len(chunk)) for first_seq, chunk, _ in chunks] == [(0, 3), (3, 3), (6, 1)]
+    assert [row["epoch"] for _, chunk, _ in chunks for row in chunk] == list(range(7))
+
+
+def test_resume_continues_after_rows_done(tmp_path):
+    """rows_done counts every row read, rejected ones included, so resuming skips exactly those."""
+    rows = numbered_rows(10)
+    rows[4]["epoch"] = ""
+    path = write_csv(tmp_path / "runs.csv", rows)
+
+    rows_done = 0
+    for _, chunk, _ in itertools.islice(_chunks(path, 0, 3), 2):  # interrupted after two chunks
+        rows_done += len(chunk)
+    resumed = list(_chunks(path, rows_done, 3))
+
+    assert rows_done == 6
+    assert [(first_seq, len(chunk)) for first_seq, chunk, _ in resumed] == [(6, 3), (9, 1)]
+    assert [row["epoch"] for _, chunk, _ in resumed for row in chunk] == [6, 7, 8, 9]
+    assert list(_chunks(path, 10, 3)) == []
+
+
+def test_rejected_row_numbers_account_for_skipped_rows(tmp_path):
+    rows = numbered_rows(6)
+    rows[4]["epoch"] = ""
+    path = write_csv(tmp_path / "runs.csv", rows)
+    rejected = [r for _, _, rejected in _chunks(path, 3, 2) for r in rejected]
+    assert [row_number for row_number, _ in rejected] == [5]
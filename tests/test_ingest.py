@@ -0,0 +1,71 @@
+import pytest
+
+from models import Metric, ResourceUsage
+
+
+def metric(epoch, accuracy=0.9):
+    return {"epoch": epoch, "accuracy": accuracy, "precision": 0.8, "recall": 0.7, "loss": 0.1}
+
+
+def metrics(client, auth_headers, experiment_id):
+    return client.get(f"/experiments/{experiment_id}/metrics", headers=auth_headers).json()
+
+
+@pytest.mark.parametrize("path, params", [
+    ("/metrics", metric(0)),
+    ("/resource-usage", {"epoch": 0, "cpu_usage_percent": 10}),
+])
+def test_single_point_routes_reject_unknown_api_keys(client, experiment, path, params):
+    _, experiment_id = experiment
+    response = client.post(path, params={"experiment_id": experiment_id, **params}, headers={"X-API-Key": "bogus"})
+    assert response.status_code == 403
+
+
+def test_resending_an_epoch_keeps_one_row(client, auth_headers, experiment, db):
+    _, experiment_id = experiment
+    for accuracy in (0.5, 0.6):
+        response = client.post("/metrics", params={"experiment_id": experiment_id, **metric(0, accuracy)},
+                               headers=auth_headers)
+        assert response.status_code == 200
+    response = client.post("/metrics/batch", headers=auth_headers, json={
+        "experiment_id": experiment_id, "points": [metric(0, 0.7), metric(1), metric(0, 0.8)]})
+    assert response.json() == {"status": "metrics added", "count": 2}
+
+    rows = metrics(client, auth_headers, experiment_id)
+    assert [(row["epoch"], row["accuracy"]) for row in rows] == [(0, 0.8), (1, 0.9)]
+    assert db.query(Metric).filter_by(experiment_id=experiment_id).count() == 2
+
+
+def test_repeated_idempotency_key_returns_stored_response_without_writing(client, auth_headers, experiment, db):
+    _, experiment_id = experiment
+    headers = dict(auth_headers, **{"Idempotency-Key": "batch-1"})
+    first = client.post("/metrics/batch", headers=headers,
+                        json={"experiment_id": experiment_id, "points": [metric(0, 0.5)]})
+    retry = client.post("/metrics/batch", headers=headers,
+                        json={"experiment_id": experiment_id, "points": [metric(0, 0.9), metric(1)]})
+    assert first.status_code == retry.status_code == 200
+    assert retry.json() == first.json() == {"status": "metrics added", "count": 1}
+    assert [(row["epoch"], row["accuracy"]) for row in metrics(client, auth_headers, experiment_id)] == [(0, 0.5)]
+
+    headers["Idempotency-Key"] = "usage-1"
+    params = {"experiment_id": experiment_id, "epoch": 0, "cpu_usage_percent": 10}
+    assert client.post("/resource-usage", params=params, headers=headers).status_code == 200
+    assert client.post("/resource-usage", params=dict(params, cpu_usage_percent=99), headers=headers).json() == {
+        "status": "resource usage added"}
+    assert [row.cpu_usage_percent for row in db.query(ResourceUsage).filter_by(experiment_id=experiment_id)] == [10]
+
+
+def test_overwritten_resource_usage_epoch_is_not_double_counted(client, auth_headers, experiment):
+    _, experiment_id = experiment
+    for epoch, cpu in ((0, 10), (1, 20)):
+        client.post("/resource-usage", headers=auth_headers, params={
+            "experiment_id": experiment_id, "epoch": epoch, "cpu_usage_percent": cpu, "training_time_sec": 30})
+    client.post("/resource-usage/batch", headers=auth_headers, json={
+        "experiment_id": experiment_id,
+        "points": [{"epoch": 1, "cpu_usage_percent": 40, "training_time_sec": 30}]})
+
+    summary = client.get(f"/experiments/{experiment_id}/resource-usage/summary", headers=auth_headers).json()
+    cpu = summary["metrics"]["cpu_usage_percent"]
+    assert cpu["samples"] == 2
+    assert (cpu["min"], cpu["max"], cpu["mean"]) == (10, 40, 25)
+    assert summary["total_training_time_sec"] == 60
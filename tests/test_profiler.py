@@ -0,0 +1,39 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import profiler
+
+
+def profiled_unit(profile, started):
+    profile.attach_current_thread()
+    started.set()
+    busy_until = time.monotonic() + 0.1
+    while time.monotonic() < busy_until:
+        pass
+
+
+def unrelated_unit(done):
+    busy_until = time.monotonic() + 0.2
+    while time.monotonic() < busy_until:
+        pass
+    done.set()
+
+
+def test_worker_is_detached_once_it_moves_on_to_other_work(monkeypatch):
+    monkeypatch.setattr(profiler, "SAMPLE_INTERVAL_SECONDS", 0.002)
+    profile = profiler.Profile("GET", "/test", "header")
+    started, done = threading.Event(), threading.Event()
+    # A single worker, like a threadpool thread serving one request after another
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        profile.start()
+        pool.submit(profiled_unit, profile, started)
+        started.wait()
+        pool.submit(unrelated_unit, done)
+        done.wait()
+        profile.stop()
+
+    stacks = "\n".join(profile.samples)
+    assert "profiled_unit" in stacks
+    assert "unrelated_unit" not in stacks
+    assert profile.threads == {}
@@ -0,0 +1,155 @@
+"""Statement counts per route must not grow with the amount of data (no N+1 queries).
+
+Every route is requested against a small and a 10x larger dataset with QUERY_BUDGET_STRICT
+enabled, so going over the budget declared on the route fails the request, and the number of
+statements issued at both sizes must be identical.
+"""
+import pytest
+
+import query_budget
+import rate_limit
+from archive import archive_experiment
+from database import Base, SessionLocal
+from models import Experiment, Metric, ModelFile, Project, ResourceUsage, User
+from hyperparams import add_tags, set_hyperparameters
+from routers import projects_router
+
+from conftest import StatementCounter, engine
+
+SMALL = 3
+LARGE = 10 * SMALL
+EPOCHS = 4
+
+
+@pytest.fixture(autouse=True)
+def strict_budgets(monkeypatch):
+    monkeypatch.setattr(query_budget, "QUERY_BUDGET_STRICT", True)
+
+
+@pytest.fixture(autouse=True)
+def no_charts(monkeypatch):
+    # The chart helpers write PNGs to a hard-coded directory; only the queries matter here
+    monkeypatch.setattr(projects_router, "generate_chart", lambda *args, **kwargs: "file:///chart.png")
+    monkeypatch.setattr(projects_router, "generate_metric_line_chart", lambda *args, **kwargs: "file:///chart.png")
+
+
+def seed(n: int, tmp_path) -> dict:
+    """A user with one project of n experiments, each with metrics, resource usage, a checkpoint,
+    hyperparameters and tags. Every other experiment except the first is archived."""
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    # Both sizes start with a cold API key cache, so admission control looks the key up each time
+    rate_limit.api_keys.clear()
+    db = SessionLocal()
+    try:
+        user = User(username="alice", email="alice@example.com", hashed_password="x", api_key="test-key")
+        project = Project(name="vision", description="image models", owner=user)
+        db.add_all([user, project])
+        db.flush()
+        experiments = []
+        for i in range(n):
+            experiment = Experiment(name=f"jolly-otter-{i}", description="resnet baseline", owner=user,
+                                    project_id=project.id)
+            db.add(experiment)
+            db.flush()
+            experiments.append(experiment)
+            for epoch in range(EPOCHS):
+                db.add(Metric(experiment_id=experiment.id, epoch=epoch, accuracy=0.5 + epoch / 10,
+                              precision=0.5, recall=0.5, loss=1.0 / (epoch + 1)))
+                db.add(ResourceUsage(experiment_id=experiment.id, epoch=epoch, cpu_usage_percent=50.0,
+                                     memory_usage_mb=1024.0, gpu_usage_percent=80.0, gpu_memory_usage_mb=2048.0,
+                                     training_time_sec=30.0))
+            path = tmp_path / f"n{n}_e{i}.pt"
+            path.write_bytes(b"weights")
+            db.add(ModelFile(experiment_id=experiment.id, file_path=str(path), version=1, size_bytes=7))
+            set_hyperparameters(db, experiment.id, {"lr": 0.01 * (i + 1), "optimizer": "adam"})
+            add_tags(db, experiment.id, ["baseline"])
+        db.flush()
+        for experiment in experiments[1::2]:
+            archive_experiment(db, experiment)
+        db.commit()
+        return {"user_id": user.id, "project_id": project.id, "experiment_id": experiments[0].id}
+    finally:
+        db.close()
+
+
+def request(client, headers, route: str, ids: dict, n: int):
+    project_id, experiment_id = ids["project_id"], ids["experiment_id"]
+    routes = {
+        "GET /projects": lambda: client.get("/projects", headers=headers),
+        "GET /projects/{id}/experiments": lambda: client.get(f"/projects/{project_id}/experiments", headers=headers),
+        "GET /projects/{id}/experiments?filter": lambda: client.get(
+            f"/projects/{project_id}/experiments", params={"filter": "lr>0 AND optimizer=adam", "limit": 1000},
+            headers=headers),
+        "GET /projects/{id}/resource-usage/summary": lambda: client.get(
+            f"/projects/{project_id}/resource-usage/summary", headers=headers),
+        "GET /projects/{id}/report": lambda: client.get(f"/projects/{project_id}/report", headers=headers),
+        "GET /projects/{id}/models/bundle": lambda: client.get(f"/projects/{project_id}/models/bundle",
+                                                               headers=headers),
+        "GET /profile": lambda: client.get("/profile", headers=headers),
+        "GET /search": lambda: client.get("/search", params={"q": "otter"}, headers=headers),
+        "GET /experiments/{id}/metrics": lambda: client.get(f"/experiments/{experiment_id}/metrics", headers=headers),
+        "GET /experiments/{id}/metrics/last": lambda: client.get(f"/experiments/{experiment_id}/metrics/last",
+                                                                 headers=headers),
+        "GET /experiments/{id}/resource-usage": lambda: client.get(f"/experiments/{experiment_id}/resource-usage",
+                                                                   headers=headers),
+        "GET /experiments/{id}/resource-usage/summary": lambda: client.get(
+            f"/experiments/{experiment_id}/resource-usage/summary", headers=headers),
+        "GET /experiments/{id}/checkpoints": lambda: client.get(f"/experiments/{experiment_id}/checkpoints",
+                                                                headers=headers),
+        "GET /experiments/{id}/model": lambda: client.get(f"/experiments/{experiment_id}/model", headers=headers),
+        "DELETE /experiments/{id}": lambda: client.delete(f"/experiments/{experiment_id}", headers=headers),
+        "POST /experiments/{id}/archive": lambda: client.post(f"/experiments/{experiment_id}/archive",
+                                                               headers=headers),
+        "POST /metrics/batch": lambda: client.post("/metrics/batch", headers=headers, json={
+            "experiment_id": experiment_id,
+            "points": [{"epoch": epoch, "accuracy": 0.9, "precision": 0.9, "recall": 0.9, "loss": 0.1}
+                       for epoch in range(n)],
+        }),
+        "POST /resource-usage/batch": lambda: client.post("/resource-usage/batch", headers=headers, json={
+            "experiment_id": experiment_id,
+            "points": [{"epoch": EPOCHS + epoch, "cpu_usage_percent": 10.0} for epoch in range(n)],
+        }),
+        "POST /experiments/{id}/metadata": lambda: client.post(
+            f"/experiments/{experiment_id}/metadata", headers=headers,
+            json={"hyperparameters": {f"p{i}": i for i in range(n)}, "tags": [f"t{i}" for i in range(n)]}),
+    }
+    return routes[route]()
+
+
+ROUTES = [
+    "GET /projects",
+    "GET /projects/{id}/experiments",
+    "GET /projects/{id}/experiments?filter",
+    "GET /projects/{id}/resource-usage/summary",
+    "GET /projects/{id}/report",
+    "GET /projects/{id}/models/bundle",
+    "GET /profile",
+    "GET /search",
+    "GET /experiments/{id}/metrics",
+    "GET /experiments/{id}/metrics/last",
+    "GET /experiments/{id}/resource-usage",
+    "GET /experiments/{id}/resource-usage/summary",
+    "GET /experiments/{id}/checkpoints",
+    "GET /experiments/{id}/model",
+    "DELETE /experiments/{id}",
+    "POST /experiments/{id}/archive",
+    "POST /metrics/batch",
+    "POST /resource-usage/batch",
+    "POST /experiments/{id}/metadata",
+]
+
+
+@pytest.mark.parametrize("route", ROUTES)
+def test_statement_count_does_not_grow_with_data(client, auth_headers, route, tmp_path):
+    counts = {}
+    for n in (SMALL, LARGE):
+        ids = seed(n, tmp_path)
+        counter = StatementCounter()
+        try:
+            response = request(client, auth_headers, route, ids, n)
+        finally:
+            counter.close()
+        assert response.status_code == 200, response.text
+        counts[n] = counter.count
+    assert counts[SMALL] == counts[LARGE], f"{route}: {counts[SMALL]} statements for {SMALL}, {counts[LARGE]} for {LARGE}"
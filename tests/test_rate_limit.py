@@ -0,0 +1,71 @@
+import rate_limit
+
+
+def batch(experiment_id=1):
+    return {"experiment_id": experiment_id, "points": []}
+
+
+def test_unknown_api_keys_share_one_bucket(client, auth_headers):
+    burst = rate_limit.ROUTE_LIMITS["/metrics/batch"].burst
+    # Cache the real key; until then it pays its lookup from the shared bucket too
+    client.post("/metrics/batch", headers=auth_headers, json=batch())
+    burst -= 1
+    statuses = [
+        client.post("/metrics/batch", headers={"X-API-Key": f"bogus-{i}"}, json=batch()).status_code
+        for i in range(burst + 5)
+    ]
+    assert statuses[:burst] == [403] * burst
+    assert statuses[burst:] == [429] * 5
+
+    # A missing key lands in the same bucket
+    assert client.post("/metrics/batch", json=batch()).status_code == 429
+
+    # The real key still has its own, full bucket
+    response = client.post("/metrics/batch", headers=auth_headers, json=batch())
+    assert response.status_code != 429, response.text
+
+
+def test_made_up_keys_do_not_evict_real_buckets(client, auth_headers, monkeypatch):
+    monkeypatch.setattr(rate_limit, "backend", rate_limit.InMemoryBackend(max_keys=4))
+    burst = rate_limit.ROUTE_LIMITS["/metrics/batch"].burst
+    for _ in range(burst):
+        client.post("/metrics/batch", headers=auth_headers, json=batch())
+    for i in range(20):
+        client.post("/resource-usage/batch", headers={"X-API-Key": f"bogus-{i}"}, json=batch())
+
+    # Had the real key's bucket been evicted it would be full again
+    assert client.post("/metrics/batch", headers=auth_headers, json=batch()).status_code == 429
+
+
+def test_api_key_lookups_are_cached(client, user, statements):
+    headers = {"X-API-Key": "test-key"}
+    client.post("/metrics/batch", headers=headers, json=batch())
+    first = statements.count
+    client.post("/metrics/batch", headers=headers, json=batch())
+    assert statements.count - first < first
+    assert "test-key" in rate_limit.api_keys
+
+
+def test_throttled_junk_keys_issue_no_sql(client, user, statements):
+    burst = rate_limit.ROUTE_LIMITS["/metrics/batch"].burst
+    for i in range(burst):
+        client.post("/metrics/batch", headers={"X-API-Key": f"bogus-{i}"}, json=batch())
+    looked_up = statements.count
+
+    responses = [client.post("/metrics/batch", headers={"X-API-Key": f"junk-{i}"}, json=batch())
+                 for i in range(90)]
+    assert {response.status_code for response in responses} == {429}
+    assert statements.count == looked_up
+    # Unknown keys are never cached, so they can't push valid keys out
+    assert not rate_limit.api_keys.keys
+
+
+def test_concurrent_key_lookups_are_capped(client, user, monkeypatch):
+    monkeypatch.setattr(rate_limit, "_key_lookups", rate_limit.threading.BoundedSemaphore(1))
+    rate_limit._key_lookups.acquire()
+    try:
+        response = client.post("/metrics/batch", headers={"X-API-Key": "test-key"}, json=batch())
+    finally:
+        rate_limit._key_lookups.release()
+    assert response.status_code == 429
+    assert response.json()["detail"] == "Too many requests (key_lookup)"
@@ -0,0 +1,99 @@
+import math
+import random
+
+import pytest
+
+from ingest import upsert_resource_usage
+from models import ResourceUsageSummary
+from rollups import BUCKET_GROWTH, FIELDS, _percentile, add_samples, describe, merge_stats
+
+
+def exact_percentile(values, pct):
+    values = sorted(values)
+    return values[math.ceil(pct / 100 * len(values)) - 1]
+
+
+@pytest.mark.parametrize("distribution", [
+    lambda rng: rng.uniform(0, 100),
+    lambda rng: rng.lognormvariate(5, 2),
+    lambda rng: rng.expovariate(0.01),
+])
+@pytest.mark.parametrize("pct", [50, 95, 99])
+def test_percentile_is_within_a_bucket_of_the_exact_value(distribution, pct):
+    rng = random.Random(pct)
+    values = [distribution(rng) for _ in range(5000)]
+    stats = add_samples({}, [{"cpu_usage_percent": value} for value in values])
+    estimate = _percentile(stats["cpu_usage_percent"], pct)
+    exact = exact_percentile(values, pct)
+    # Bucket midpoints are at most half a bucket (~1%) away from any value in the bucket
+    assert abs(estimate - exact) / exact <= BUCKET_GROWTH - 1
+
+
+def test_percentile_edge_cases():
+    stats = add_samples({}, [{"cpu_usage_percent": v} for v in (0, 0, 0, 50)])["cpu_usage_percent"]
+    assert _percentile(stats, 50) == 0.0
+    assert _percentile(stats, 100) == pytest.approx(50, rel=BUCKET_GROWTH - 1)
+    # Estimates are clamped to the observed range
+    single = add_samples({}, [{"cpu_usage_percent": 42.0}])["cpu_usage_percent"]
+    assert _percentile(single, 1) == _percentile(single, 99) == 42.0
+    assert _percentile(add_samples({}, [])["cpu_usage_percent"], 95) is None
+
+
+def test_add_samples_skips_missing_values_and_does_not_mutate_its_input():
+    first = add_samples({}, [{"cpu_usage_percent": 10.0, "memory_usage_mb": None}])
+    second = add_samples(first, [{"cpu_usage_percent": 30.0, "training_time_sec": 5.0}])
+    assert first["cpu_usage_percent"]["count"] == 1
+    assert sum(first["cpu_usage_percent"]["hist"].values()) == 1
+    assert second["cpu_usage_percent"] | {"hist": None} == {
+        "count": 2, "sum": 40.0, "min": 10.0, "max": 30.0, "hist": None}
+    assert second["memory_usage_mb"]["count"] == 0
+    assert describe(second)["total_training_time_sec"] == 5.0
+
+
+def test_merge_stats_equals_stats_of_all_samples():
+    rng = random.Random(1)
+    experiments = [[{field: rng.uniform(0, 1000) for field in FIELDS if rng.random() < 0.8} for _ in range(n)]
+                   for n in (0, 1, 50, 200)]
+    merged = merge_stats([add_samples({}, samples) for samples in experiments] + [None, {}])
+    combined = add_samples({}, [sample for samples in experiments for sample in samples])
+    for field in FIELDS:
+        assert merged[field]["hist"] == combined[field]["hist"]
+        assert merged[field]["sum"] == pytest.approx(combined[field]["sum"])
+        assert {k: merged[field][k] for k in ("count", "min", "max")} == {
+            k: combined[field][k] for k in ("count", "min", "max")}
+    assert describe(merged)["metrics"]["cpu_usage_percent"]["p95"] == describe(combined)["metrics"][
+        "cpu_usage_percent"]["p95"]
+
+
+def test_overwritten_epochs_rebuild_the_summary(db, experiment):
+    _, experiment_id = experiment
+    upsert_resource_usage(db, experiment_id, [{"epoch": e, "cpu_usage_percent": 10.0 * (e + 1)} for e in range(3)])
+    db.commit()
+    # Epoch 2 is replaced, epoch 3 is new; the batch also repeats epoch 3, where the last point wins
+    upsert_resource_usage(db, experiment_id, [{"epoch": 2, "cpu_usage_percent": 90.0},
+                                              {"epoch": 3, "cpu_usage_percent": 1.0},
+                                              {"epoch": 3, "cpu_usage_percent": 40.0}])
+    db.commit()
+
+    summary = db.get(ResourceUsageSummary, experiment_id)
+    db.refresh(summary)
+    cpu = summary.stats["cpu_usage_percent"]
+    assert summary.sample_count == 4
+    assert (cpu["count"], cpu["sum"], cpu["min"], cpu["max"]) == (4, 160.0, 10.0, 90.0)
+    assert summary.stats == add_samples({}, [{"cpu_usage_percent": v} for v in (10.0, 20.0, 90.0, 40.0)])
+
+
+def test_project_summary_merges_experiments(client, auth_headers, experiment):
+    project_id, first = experiment
+    second = client.post("/experiments", params={"project_id": project_id, "description": ""},
+                         headers=auth_headers).json()["experiment_id"]
+    for experiment_id, values in ((first, (10, 20)), (second, (30, 40, 50))):
+        client.post("/resource-usage/batch", headers=auth_headers, json={
+            "experiment_id": experiment_id,
+            "points": [{"epoch": e, "cpu_usage_percent": v, "training_time_sec": 10} for e, v in enumerate(values)]})
+
+    summary = client.get(f"/projects/{project_id}/resource-usage/summary", headers=auth_headers).json()
+    cpu = summary["metrics"]["cpu_usage_percent"]
+    assert summary["experiment_count"] == 2
+    assert (cpu["samples"], cpu["min"], cpu["max"], cpu["mean"]) == (5, 10, 50, 30)
+    assert summary["total_training_time_sec"] == 50